@@ -0,0 +1,430 @@
+"""
+Hot-path benchmarks: how opening, saving, autosaving, the buffer history and the live preview
+scale with document size, from 10 KB to 100 MB, with thousands of buffers in the history.
+
+    xvfb-run -a python benchmarks/hotpaths.py --output results.json
+    xvfb-run -a python benchmarks/hotpaths.py --sizes 10K,1M --baseline results.json
+
+Without a display on Linux the suite re-runs itself under xvfb-run when it is installed.
+Every (operation, size) pair runs in its own editor process on a private copy of the editor,
+with an empty config and a copy of the same pre-filled buffer history, so peak RSS and bytes
+written belong to that operation alone. Latencies are wall-clock milliseconds on the Tk thread,
+up to the point the editor is usable again (a chunked load has finished, a dialog is filled in).
+
+With --baseline, p50 latencies and peak RSS are compared to an earlier results file and the
+exit status is 1 if any of them grew by more than --tolerance.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import platform
+import argparse
+import resource
+import subprocess
+import tempfile
+
+from startup import copy_editor
+
+SIZES = {"10K": 10 << 10, "100K": 100 << 10, "1M": 1 << 20, "10M": 10 << 20, "100M": 100 << 20}
+OPERATIONS = ("open_file", "save_file", "autosave", "new_file", "save_buffer", "load_from_buffer", "preview")
+EDITOR_STATE = ("config.json", "journal.jsonl", "autosave.txt", "buffers.sqlite3", "path_index.json")
+CHILD_TIMEOUT = 3600
+
+BLOCK = (
+    "<h2>Section {n}</h2>\n"
+    "<p>The energy is $E = mc^2$ and $$\\int_0^1 x^2\\,dx = \\frac{{1}}{{3}}$$ holds for section {n}.</p>\n"
+    "<!-- note {n} --> <a href=\"#s{n}\">link</a> and some plain text that wraps across the line.\n"
+)
+
+
+def synthetic_text(size, seed=0):
+    """HTML and KaTeX of exactly size characters."""
+    blocks = []
+    length = 0
+    n = seed
+    while length < size:
+        block = BLOCK.format(n=n)
+        blocks.append(block)
+        length += len(block)
+        n += 1
+    return "".join(blocks)[:size]
+
+
+def iterations_for(size):
+    return max(3, min(20, (20 << 20) // size))
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of sorted samples."""
+    return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "iterations": len(samples),
+        "p50_ms": round(percentile(samples, 0.50), 3),
+        "p90_ms": round(percentile(samples, 0.90), 3),
+        "p99_ms": round(percentile(samples, 0.99), 3),
+        "max_ms": round(samples[-1], 3),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)  # Bytes on macOS, KB elsewhere
+
+
+def bytes_written():
+    """
+    Bytes this process has sent towards storage so far, all threads included (Linux only).
+    Unlike wchar this leaves out sockets, so X11 and HTTP traffic aren't counted.
+    """
+    try:
+        with open("/proc/self/io", "r") as io_file:
+            for line in io_file:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class Session:
+    """An editor in this process, with dialogs answered automatically and an event loop pump."""
+
+    def __init__(self, folder):
+        sys.path.insert(0, folder)
+        import tkinter as tk
+        import mutext
+
+        self.errors = []
+        messagebox = mutext.messagebox
+        messagebox.askyesno = lambda *args, **kwargs: False
+        messagebox.askyesnocancel = lambda *args, **kwargs: False
+        messagebox.showinfo = messagebox.showwarning = lambda *args, **kwargs: None
+        messagebox.showerror = lambda title, message, **kwargs: self.errors.append(message)
+        self.root = tk.Tk()
+        self.root.geometry("1200x800")
+        self.editor = mutext.MuText(self.root)
+        self.root.after_cancel(self.editor.autosave_job)  # Autosave only runs when the benchmark calls it
+        self.editor.large_file_threshold_mb = 1 << 20  # Keep every size in the Text widget, except for open_file
+        self.idle()
+
+    def idle(self):
+        self.root.update()
+
+    def wait(self, condition):
+        while not condition():
+            self.root.update()
+            time.sleep(0.001)
+        self.idle()
+
+    def loaded(self):
+        return not self.editor.loading
+
+    def open(self, path):
+        self.editor.open_file(file_path=path)
+        self.wait(self.loaded)
+
+    def type_text(self, text="x"):
+        self.editor.text_area.insert("end -1c", text)
+        self.idle()
+
+    def find_window(self, cls):
+        """The newest toplevel's first descendant of class cls."""
+        windows = [child for child in self.root.winfo_children() if child.winfo_class() == "Toplevel"]
+        stack = list(windows[-1:])
+        while stack:
+            widget = stack.pop(0)
+            if isinstance(widget, cls):
+                return widget
+            stack.extend(widget.winfo_children())
+        return None
+
+
+def timed(samples, action, *args):
+    started = time.perf_counter()
+    action(*args)
+    samples.append((time.perf_counter() - started) * 1000)
+
+
+def bench_open_file(session, path, iterations):
+    """Open a document (through the large-file view above its threshold) and close it again."""
+    session.editor.large_file_threshold_mb = 64
+    samples = []
+    for _ in range(iterations):
+        timed(samples, session.open, path)
+        session.editor.close_document()
+        session.idle()
+    return {"open_file": samples}
+
+
+def bench_save_file(session, path, iterations):
+    session.open(path)
+    samples = []
+    for _ in range(iterations):
+        session.type_text()
+        timed(samples, session.editor.save_file)
+    return {"save_file": samples}
+
+
+def bench_autosave(session, path, iterations):
+    """Tk-thread cost of handing a snapshot over, and time until the background writer has it on disk."""
+    session.open(path)
+    editor = session.editor
+    submit, durable = [], []
+    for _ in range(iterations):
+        session.type_text()
+        started = time.perf_counter()
+        editor.autosave()
+        submit.append((time.perf_counter() - started) * 1000)
+        editor.autosave_writer.flush()
+        durable.append((time.perf_counter() - started) * 1000)
+        editor.root.after_cancel(editor.autosave_job)
+    return {"autosave": submit, "autosave_durable": durable}
+
+
+def bench_new_file(session, path, iterations):
+    """Put the open document away in its tab and start an empty one."""
+    session.open(path)
+    samples = []
+    for _ in range(iterations):
+        timed(samples, lambda: (session.editor.new_file(), session.idle()))
+        session.editor.close_document()  # Back to the document
+        session.idle()
+    return {"new_file": samples}
+
+
+def bench_save_buffer(session, path, iterations):
+    """Close an untitled document into the buffer history and wait for it to be written."""
+    with open(path, "r", encoding="utf-8") as document:
+        text = document.read()
+    editor = session.editor
+    samples = []
+    for i in range(iterations):
+        editor.new_file()
+        editor.text_area.insert("1.0", f"{i}\n{text}")  # Distinct texts, so none is skipped as a repeat
+        session.idle()
+        timed(samples, lambda: (editor.close_document(), editor.save_buffer()))
+    return {"save_buffer": samples}
+
+
+def bench_load_from_buffer(session, path, iterations):
+    """Open the buffer dialog over the whole history and load the newest buffer, which has this size."""
+    import mutext
+
+    with open(path, "r", encoding="utf-8") as document:
+        session.editor.load_buffer().append(document.read())
+    session.editor.save_buffer()
+    samples = []
+
+    def load():
+        session.editor.load_from_buffer()
+        session.find_window(mutext.VirtualListbox).activate()
+        session.idle()
+
+    for _ in range(iterations):
+        timed(samples, load)
+        session.editor.close_document()
+        session.editor.save_buffer()
+        session.idle()
+    return {"load_from_buffer": samples}
+
+
+def bench_preview(path, iterations):
+    """LivePreviewHandler responses: a new version (page built on request), then the cached page, then gzip."""
+    import http.client
+    from mutext_render import DocumentSnapshot
+    from mutext_preview import PreviewDocument, PreviewServer
+
+    with open(path, "r", encoding="utf-8") as document:
+        text = document.read()
+    server = PreviewServer(PreviewDocument(), "127.0.0.1", 0)
+    port = server.start(0)
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+
+    def get(headers):
+        connection.request("GET", "/", headers=headers)
+        connection.getresponse().read()
+
+    metrics = {"preview_new_version": [], "preview_cached": [], "preview_gzip": []}
+    for version in range(iterations):
+        server.publish(version, DocumentSnapshot(version, text=text))
+        timed(metrics["preview_new_version"], get, {})
+        timed(metrics["preview_cached"], get, {})
+        timed(metrics["preview_gzip"], get, {"Accept-Encoding": "gzip"})
+    connection.close()
+    server.stop()
+    return metrics
+
+
+BENCHMARKS = {
+    "open_file": bench_open_file,
+    "save_file": bench_save_file,
+    "autosave": bench_autosave,
+    "new_file": bench_new_file,
+    "save_buffer": bench_save_buffer,
+    "load_from_buffer": bench_load_from_buffer,
+}
+
+
+def run_child(folder, operation, path, iterations):
+    """Run one benchmark in this process and print its measurements as JSON."""
+    if operation == "preview":
+        sys.path.insert(0, folder)  # The preview server needs no Tk
+        setup_rss = peak_rss_mb()
+        written = bytes_written()
+        metrics = bench_preview(path, iterations)
+        errors = []
+    else:
+        session = Session(folder)
+        setup_rss = peak_rss_mb()
+        written = bytes_written()
+        metrics = BENCHMARKS[operation](session, path, iterations)
+        session.editor.autosave_writer.flush()
+        session.editor.save_buffer()
+        errors = session.errors
+    after = bytes_written()
+    print(json.dumps({
+        "metrics": metrics,
+        "setup_rss_mb": setup_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        "bytes_written": None if written is None else after - written,
+        "errors": errors,
+    }), flush=True)
+    os._exit(0)  # Don't wait on the editor's background threads
+
+
+def prepare(scratch, sizes, buffers):
+    """Copy the editor, write the documents and fill a template buffer history."""
+    folder = os.path.join(scratch, "editor")
+    os.mkdir(folder)
+    copy_editor(folder)
+    documents = {}
+    for name, size in sizes.items():
+        documents[name] = os.path.join(scratch, f"document-{name}.html")
+        with open(documents[name], "w", encoding="utf-8") as document:
+            document.write(synthetic_text(size))
+    sys.path.insert(0, folder)
+    import mutext
+
+    template = os.path.join(scratch, "buffers.sqlite3")
+    store = mutext.BufferStore(template, max_entries=buffers + 1000)
+    for i in range(buffers):
+        store.append(synthetic_text(500 + (i * 37) % 4000, seed=i))
+    store.flush()
+    store.close()
+    return folder, documents, template
+
+
+def run_operation(folder, template, operation, path, iterations):
+    for name in EDITOR_STATE:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(os.path.join(folder, name + suffix)):
+                os.remove(os.path.join(folder, name + suffix))
+    shutil.copy(template, os.path.join(folder, "buffers.sqlite3"))
+    if operation in ("save_file", "autosave"):
+        # These write to the document itself
+        copy = os.path.join(folder, "document" + os.path.splitext(path)[1])
+        shutil.copy(path, copy)
+        path = copy
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", folder, operation, path, str(iterations)],
+        capture_output=True, text=True, timeout=CHILD_TIMEOUT,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip() or f"{operation} exited with {result.returncode}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Regressions of results against baseline, as readable lines."""
+    regressions = []
+    for operation, sizes in results["results"].items():
+        for size, current in sizes.items():
+            previous = baseline.get("results", {}).get(operation, {}).get(size)
+            if not previous:
+                continue
+            before, after = previous["p50_ms"], current["p50_ms"]
+            if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append(f"{operation} {size}: p50 {before} ms -> {after} ms")
+            before, after = previous.get("peak_rss_mb"), current.get("peak_rss_mb")
+            if before and after and after > before * (1 + tolerance):
+                regressions.append(f"{operation} {size}: peak RSS {before} MB -> {after} MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark MuText's hot paths on synthetic documents.")
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"document sizes (default {','.join(SIZES)})")
+    parser.add_argument("--operations", default=",".join(OPERATIONS), help="operations to run (default all)")
+    parser.add_argument("--buffers", type=int, default=5000, help="entries in the buffer history (default 5000)")
+    parser.add_argument("--iterations", type=int, help="iterations per size (default: 20, fewer above 1 MB)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results file to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown or growth (default 0.25)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        folder, operation, path, iterations = args.child
+        run_child(folder, operation, path, int(iterations))
+        return 1
+
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        if not shutil.which("xvfb-run"):
+            print("No display and xvfb-run isn't installed: run this under an X server.", file=sys.stderr)
+            return 2
+        return subprocess.call(["xvfb-run", "-a", sys.executable, os.path.abspath(__file__)] + sys.argv[1:])
+
+    sizes = {name: SIZES[name] for name in args.sizes.split(",")}
+    operations = args.operations.split(",")
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "buffers": args.buffers,
+        "results": {},
+        "errors": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="mutext-bench-") as scratch:
+        folder, documents, template = prepare(scratch, sizes, args.buffers)
+        for operation in operations:
+            for name, size in sizes.items():
+                iterations = args.iterations or iterations_for(size)
+                print(f"{operation} {name} x{iterations}", file=sys.stderr, flush=True)
+                try:
+                    measured = run_operation(folder, template, operation, documents[name], iterations)
+                except (RuntimeError, subprocess.TimeoutExpired) as e:
+                    results["errors"].append(f"{operation} {name}: {e}")
+                    continue
+                results["errors"] += [f"{operation} {name}: {error}" for error in measured["errors"]]
+                for metric, samples in measured["metrics"].items():
+                    summary = summarize(samples)
+                    summary["setup_rss_mb"] = measured["setup_rss_mb"]
+                    summary["peak_rss_mb"] = measured["peak_rss_mb"]
+                    if measured["bytes_written"] is not None:
+                        summary["bytes_written_per_op"] = measured["bytes_written"] // len(samples)
+                    results["results"].setdefault(metric, {})[name] = summary
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(report + "\n")
+    print(report)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 1 if results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
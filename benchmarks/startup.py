@@ -0,0 +1,157 @@
+"""
+Startup benchmark: import time and time to first keystroke, cold and warm.
+
+    python benchmarks/startup.py --runs 10 --output startup.json
+
+Each run launches a fresh interpreter on a private copy of the editor, so your config, buffers
+and journal are never touched and every run starts from the same (empty) settings.
+"Cold" runs never write bytecode caches for it, so the editor's modules are compiled on every
+launch; "warm" runs reuse a __pycache__ primed by a first, discarded run.
+The OS file cache isn't dropped (that needs root), so cold numbers are a lower bound.
+
+Time to first keystroke is measured from just before the interpreter is started until a
+synthetic key press has been handled by the text widget, which needs a display
+(on Linux without one, run it under xvfb-run).
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ("mutext.py", "mutext_render.py", "mutext_preview.py", "mutext_metrics.py")
+TIMEOUT = 60
+
+
+def copy_editor(folder):
+    for name in MODULES:
+        shutil.copy(os.path.join(SOURCE_DIR, name), folder)
+
+
+def child_env(cold):
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    if cold:
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def import_time(folder, cold):
+    """Milliseconds spent importing mutext, as reported by -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import mutext"],
+        cwd=folder, env=child_env(cold), capture_output=True, text=True, timeout=TIMEOUT, check=True,
+    )
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == "mutext":
+            return int(fields[1]) / 1000
+    raise RuntimeError("mutext missing from -X importtime output")
+
+
+def first_keystroke(folder, cold):
+    """Milliseconds from launching the editor until it has handled its first key press."""
+    env = child_env(cold)
+    started = time.time()
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", folder],
+        cwd=folder, env=env, capture_output=True, text=True, timeout=TIMEOUT,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "editor failed")
+    return (float(result.stdout.split()[-1]) - started) * 1000
+
+
+def run_child(folder):
+    """Start the editor, type one key as soon as it's idle, and print the time that key was handled."""
+    sys.path.insert(0, folder)
+    import tkinter as tk
+    import mutext
+
+    root = tk.Tk()
+    editor = mutext.MuText(root)
+
+    def on_key(event):
+        print(time.time(), flush=True)
+        os._exit(0)  # Skip exit_editor's prompts and don't wait for background threads
+
+    def type_key():
+        editor.text_area.focus_force()
+        editor.text_area.event_generate("<KeyPress>", keysym="a", when="tail")
+
+    editor.text_area.bind("<Key>", on_key, add="+")
+    root.after_idle(type_key)
+    root.after(TIMEOUT * 1000, lambda: os._exit(1))
+    root.mainloop()
+
+
+def summarize(samples):
+    if not samples:
+        return None
+    return {
+        "min": round(min(samples), 2),
+        "median": round(statistics.median(samples), 2),
+        "max": round(max(samples), 2),
+        "samples": [round(sample, 2) for sample in samples],
+    }
+
+
+def measure(runs, cold, keystroke):
+    imports, keystrokes, errors = [], [], []
+    with tempfile.TemporaryDirectory(prefix="mutext-startup-") as folder:
+        copy_editor(folder)
+        if not cold:
+            import_time(folder, cold)  # Prime __pycache__
+        for _ in range(runs):
+            imports.append(import_time(folder, cold))
+            if keystroke:
+                try:
+                    keystrokes.append(first_keystroke(folder, cold))
+                except (RuntimeError, subprocess.TimeoutExpired) as e:
+                    errors.append(str(e))
+    result = {"import_ms": summarize(imports), "first_keystroke_ms": summarize(keystrokes)}
+    if errors:
+        result["errors"] = sorted(set(errors))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure MuText's cold and warm startup time.")
+    parser.add_argument("--runs", type=int, default=10, help="launches per mode (default 10)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--no-keystroke", action="store_true", help="only measure import time (no display needed)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        run_child(args.child)
+        return 1
+
+    keystroke = not args.no_keystroke
+    if keystroke and sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        print("No display: measuring import time only (run under xvfb-run for time to first keystroke)")
+        keystroke = False
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "cold": measure(args.runs, True, keystroke),
+        "warm": measure(args.runs, False, keystroke),
+    }
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(report + "\n")
+    print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
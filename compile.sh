@@ -31,9 +31,15 @@ if [ ! -f "$SCRIPT_NAME" ]; then
     exit 1
 fi
 
+# Bundle the local KaTeX copy (see fetch_katex.sh) if it has been downloaded
+EXTRA_DATA=()
+if [ -d "katex" ]; then
+    EXTRA_DATA=(--add-data "katex:katex")
+fi
+
 # Compile the script using PyInstaller to create a macOS .app bundle
 echo "Compiling $SCRIPT_NAME into a macOS .app bundle..."
-pyinstaller --windowed --noconfirm --icon="$ICON_NAME" --name="$APP_NAME" "$SCRIPT_NAME"
+pyinstaller --windowed --noconfirm --icon="$ICON_NAME" --name="$APP_NAME" "${EXTRA_DATA[@]}" "$SCRIPT_NAME"
 
 # Check if the compilation was successful
 if [ $? -eq 0 ]; then
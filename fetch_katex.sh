@@ -0,0 +1,29 @@
+#!/bin/bash
+
+# Download the KaTeX distribution into ./katex so the live preview works offline
+
+# Ensure the script works in the directory it's located
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+cd "$SCRIPT_DIR"
+
+# Variables
+KATEX_VERSION="0.16.19"
+KATEX_URL="https://registry.npmjs.org/katex/-/katex-$KATEX_VERSION.tgz"
+TARGET_DIR="katex"
+TEMP_DIR="$(mktemp -d)"
+
+echo "Downloading KaTeX $KATEX_VERSION..."
+curl -fsSL "$KATEX_URL" -o "$TEMP_DIR/katex.tgz"
+if [ $? -ne 0 ]; then
+    echo "Download failed. Check your network connection."
+    rm -rf "$TEMP_DIR"
+    exit 1
+fi
+
+# Only the dist folder is needed: CSS, JS, auto-render and fonts
+tar -xzf "$TEMP_DIR/katex.tgz" -C "$TEMP_DIR" package/dist
+rm -rf "$TARGET_DIR"
+mv "$TEMP_DIR/package/dist" "$TARGET_DIR"
+rm -rf "$TEMP_DIR"
+
+echo "Done! KaTeX is now served locally from $SCRIPT_DIR/$TARGET_DIR"
@@ -1,14 +1,1814 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, simpledialog
-import webbrowser
 import os
 import sys
+
+if __name__ == "__main__" and sys.argv[1:2] in (["render"], ["export"]):
+    # Headless batch render/export (python mutext.py render ...), dispatched before tkinter is imported.
+    # mutext_render stands in as the main module so process pool workers don't import this file either
+    import mutext_render
+    sys.modules["__main__"] = mutext_render
+    sys.exit(mutext_render.main(sys.argv[1:]))
+
+import tkinter as tk
+from tkinter import filedialog, messagebox, simpledialog
 import threading
 import json
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import time
+import codecs
+import mmap
+import bisect
+import collections
+import itertools
+import queue
+import sqlite3
+import re
+import hashlib
+import tempfile
 from datetime import datetime
 import tkinter.font as tkfont
-import subprocess
+import marshal
+import zlib
+
+from mutext_render import atomic_write, detect_encoding, DocumentSnapshot
+from mutext_metrics import METRICS, timed
+
+
+class AutosaveWriter:
+    """
+    Background writer for autosave snapshots.
+    DocumentSnapshots are handed over from the Tk thread; their text is joined, hashed and
+    written atomically on a worker thread.
+    Only the newest pending snapshot per path is kept, so bursts are coalesced into one write,
+    and a snapshot whose content hash matches the last write to that path is skipped.
+    """
+
+    def __init__(self):
+        self.pending = {}  # path -> (newest snapshot waiting to be written, encoding)
+        self.last_digest = {}  # path -> hash of the last text written there
+        self.condition = threading.Condition()
+        self.thread = None
+        self.busy = False
+        self.writing = None  # Path being written right now
+        self.stats = {"performed": 0, "skipped": 0, "coalesced": 0, "failed": 0, "bytes": 0}
+
+    def submit(self, path, snapshot, encoding="utf-8"):
+        """Queue a snapshot to be written to path, replacing any snapshot still waiting for that path."""
+        with self.condition:
+            if path in self.pending:
+                self.stats["coalesced"] += 1
+            self.pending[path] = (snapshot, encoding)
+            if not self.thread or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def skip(self):
+        """Record an autosave interval that had nothing to write."""
+        with self.condition:
+            self.stats["skipped"] += 1
+
+    def remember(self, path, text, encoding="utf-8"):
+        """Record that path already holds text (e.g. after an explicit save or open)."""
+        digest = hashlib.sha1(text.encode(encoding)).hexdigest()
+        with self.condition:
+            self.last_digest[path] = digest
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.busy = False
+                    self.condition.notify_all()
+                    self.condition.wait()
+                self.busy = True
+                # One path at a time, so cancel() can still drop every snapshot not yet being written
+                path, (snapshot, encoding) = self.pending.popitem()
+                self.writing = path
+            self.write(path, snapshot.text(), encoding)
+            with self.condition:
+                self.writing = None
+                self.condition.notify_all()
+
+    def cancel(self, path):
+        """
+        Drop the snapshot waiting for path and wait for a write to it in progress to finish.
+        Called before an explicit save, so an older snapshot can't land over the saved file.
+        """
+        with self.condition:
+            self.pending.pop(path, None)
+            self.condition.wait_for(lambda: self.writing != path)
+
+    def write(self, path, text, encoding):
+        try:
+            data = text.encode(encoding)
+        except UnicodeEncodeError as e:
+            # Left for an explicit save, which offers to switch the file to UTF-8
+            print(f"Autosave failed: {e}")
+            with self.condition:
+                self.stats["failed"] += 1
+            return
+        digest = hashlib.sha1(data).hexdigest()
+        with self.condition:
+            if self.last_digest.get(path) == digest:
+                self.stats["skipped"] += 1
+                return
+        try:
+            atomic_write(path, text, encoding)
+        except Exception as e:
+            print(f"Autosave failed: {e}")
+            with self.condition:
+                self.stats["failed"] += 1
+            return
+        with self.condition:
+            self.last_digest[path] = digest
+            self.stats["performed"] += 1
+            self.stats["bytes"] += len(data)
+
+    def flush(self, timeout=5.0):
+        """Block until every queued snapshot has been written (used on exit)."""
+        with self.condition:
+            self.condition.wait_for(lambda: not self.pending and not self.busy, timeout)
+
+
+class EditJournal:
+    """
+    Write-ahead journal of the edits to one document, for recovery after a crash; every tab has its own.
+    The file starts with a checkpoint (the document's path and, unless it was just opened or
+    saved, its full text) followed by one JSON line per insert/delete. Edits are appended by a
+    background thread in batches every batch_interval seconds, so a keystroke costs a list
+    append; a new checkpoint replaces the file once checkpoint_bytes of edits have piled up.
+    After a save or open the text isn't written at all until the first edit needs it as a base.
+    """
+
+    batch_interval = 0.2
+    checkpoint_bytes = 1 << 20
+
+    def __init__(self, path):
+        self.path = path
+        self.items = []  # Lines and checkpoints waiting for the writer thread
+        self.condition = threading.Condition()
+        self.thread = None
+        self.busy = False
+        self.base = None  # (path, snapshot) of a saved document, checkpointed once it is edited
+        self.pending_bytes = 0  # Edits written since the last checkpoint
+        self.file = None
+
+    def start(self, path, snapshot, saved):
+        """Begin a new journal for the document in snapshot (saved: it matches the file at path)."""
+        if saved:
+            self.base = (path, snapshot)
+            self.queue(("checkpoint", path, None))
+        else:
+            self.base = None
+            self.queue(("checkpoint", path, snapshot))
+
+    def record(self, kind, offset, text):
+        if self.base:
+            self.queue(("checkpoint",) + self.base)
+            self.base = None
+        line = json.dumps(["i", offset, text] if kind == "insert" else ["d", offset, len(text)]) + "\n"
+        self.pending_bytes += len(line)
+        self.queue(line)
+
+    def needs_checkpoint(self):
+        return self.pending_bytes > self.checkpoint_bytes
+
+    def queue(self, item):
+        if isinstance(item, tuple):
+            self.pending_bytes = 0
+        with self.condition:
+            self.items.append(item)
+            if not self.thread or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            if len(self.items) == 1:
+                self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.items:
+                    self.busy = False
+                    self.condition.notify_all()
+                    self.condition.wait()
+                self.busy = True
+            time.sleep(self.batch_interval)  # Let a burst of keystrokes pile up into one write
+            with self.condition:
+                items = self.items
+                self.items = []
+            try:
+                self.write(items)
+            except Exception as e:
+                print(f"Journal write failed: {e}")
+
+    def write(self, items):
+        # Only the last checkpoint in the batch and the edits after it matter
+        for position in range(len(items) - 1, -1, -1):
+            if isinstance(items[position], tuple):
+                _, path, snapshot = items[position]
+                header = {"path": path, "text": snapshot.text() if snapshot else None}
+                if self.file:
+                    self.file.close()
+                atomic_write(self.path, json.dumps(header) + "\n")
+                self.file = open(self.path, "a", encoding="utf-8", newline="")
+                items = items[position + 1:]
+                break
+        if items and self.file:
+            self.file.write("".join(items))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def flush(self, timeout=5.0):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.items and not self.busy, timeout)
+
+    def close(self):
+        """Clean exit: write out what is queued, then drop the journal since nothing needs recovering."""
+        self.flush()
+        if self.file:
+            self.file.close()
+            self.file = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def recover(path):
+        """Replay a journal left behind by a crash; return (document path, text) or None if nothing was unsaved."""
+        try:
+            with open(path, "r", encoding="utf-8") as journal:
+                header = json.loads(journal.readline())
+                if header.get("text") is None:
+                    return None  # Saved document with no edits after it
+                document = DocumentModel()
+                document.reset(header["text"])
+                for line in journal:
+                    try:
+                        kind, offset, value = json.loads(line)
+                    except ValueError:
+                        break  # A batch cut short by the crash; everything before it is intact
+                    if kind == "i":
+                        document.insert(offset, value)
+                    else:
+                        document.delete(offset, offset + value)
+        except (OSError, ValueError, KeyError):
+            return None
+        return header["path"], document.rope.text()
+
+
+def read_chunks(path, encoding, chunk_size=1 << 16, errors="strict"):
+    """
+    Yield (text, bytes read so far) chunks of a file.
+    Undecodable bytes raise UnicodeDecodeError, or become U+FFFD with errors="replace".
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(chunk_size)
+            text = decoder.decode(data, final=not data)
+            if text:
+                yield text, file.tell()
+            if not data:
+                return
+
+
+class LineIndex:
+    """
+    Sparse line index over a memory-mapped file, built on a background thread.
+    Only the number of newlines before each 64 KB block is stored, so the index stays tiny;
+    exact line starts are found by scanning at most one block.
+    """
+
+    block_size = 1 << 16
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.block_lines = [0]  # Newlines before the start of each indexed block
+        self.total_lines = None  # Known once the whole file has been indexed
+        self.cancelled = False
+
+    def build(self):
+        count = 0
+        for start in range(0, self.size, self.block_size):
+            if self.cancelled:
+                return
+            try:
+                count += self.data[start:start + self.block_size].count(b"\n")
+            except ValueError:
+                return  # The view was closed and the mapping with it
+            self.block_lines.append(count)
+        self.total_lines = count + 1
+
+    def line_start_after(self, pos, lines):
+        """Return the offset of the line starting `lines` lines after the line start pos (or the file size)."""
+        for _ in range(lines):
+            newline = self.data.find(b"\n", pos)
+            if newline < 0:
+                return self.size
+            pos = newline + 1
+        return pos
+
+    def line_start_before(self, pos, lines):
+        """Return (offset, lines actually moved) going back up to `lines` lines from the line start pos."""
+        moved = 0
+        while moved < lines and pos > 0:
+            pos = self.data.rfind(b"\n", 0, pos - 1) + 1
+            moved += 1
+        return pos, moved
+
+    def offset_of_line(self, line):
+        """Byte offset of a 0-based line, or None if the index hasn't reached it yet."""
+        if line <= 0:
+            return 0
+        if line > self.block_lines[-1]:
+            if self.total_lines is None:
+                return None
+            line = self.total_lines - 1
+        # Last block that starts before the newline ending line - 1
+        block = bisect.bisect_left(self.block_lines, line) - 1
+        pos = block * self.block_size
+        return self.line_start_after(pos, line - self.block_lines[block])
+
+    def line_of_offset(self, pos):
+        """0-based line number of the byte offset pos, or None if the index hasn't reached it yet."""
+        block = pos // self.block_size
+        if block >= len(self.block_lines) - 1 and self.total_lines is None:
+            return None
+        start = block * self.block_size
+        return self.block_lines[block] + self.data[start:pos].count(b"\n")
+
+
+class LargeFileView:
+    """
+    Read-only view of a file too large for tk.Text: the file is memory-mapped and only a window
+    of lines around the visible area lives in the widget, swapped as the view nears either edge.
+    """
+
+    window_lines = 3000  # Lines kept in the Text widget
+    shift_lines = 1000  # Lines swapped in or out when the view nears an edge of the window
+
+    def __init__(self, editor, path, encoding):
+        self.editor = editor
+        self.text_area = editor.text_area
+        self.path = path
+        self.encoding = encoding
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = LineIndex(self.data)
+        self.start = 0  # Byte offsets of the window
+        self.end = 0
+        self.shift_job = None
+        threading.Thread(target=self.index.build, daemon=True).start()
+
+        self.scrollbar = tk.Scrollbar(editor.root, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill="y", before=self.text_area)
+        self.text_area.config(yscrollcommand=self.on_text_scroll)
+        editor.undo_history.enabled = False
+        editor.journaling = False  # The window's contents are read-only file text, not edits
+        self.show_window(0)
+        self.update_title()
+
+    def show_window(self, start, top_offset=None):
+        """Fill the widget with window_lines lines from byte offset start; keep top_offset at the top of the view."""
+        self.start = start
+        self.end = self.index.line_start_after(start, self.window_lines)
+        text = self.data[self.start:self.end].decode(self.encoding, errors="replace")
+        self.text_area.config(state="normal")
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.insert(1.0, text)
+        self.text_area.config(state="disabled")
+        self.text_area.edit_modified(False)
+        if top_offset is not None:
+            top_line = self.data[self.start:top_offset].count(b"\n") + 1
+            self.text_area.yview(f"{top_line}.0")
+
+    def top_offset(self):
+        """Byte offset of the first visible line."""
+        top_line = int(self.text_area.index("@0,0").split(".")[0])
+        return self.index.line_start_after(self.start, top_line - 1)
+
+    def on_text_scroll(self, top, bottom):
+        self.editor.on_view_scroll(top, bottom)
+        # Show the position within the whole file, not within the window
+        span = self.end - self.start
+        size = max(self.index.size, 1)
+        self.scrollbar.set((self.start + float(top) * span) / size, (self.start + float(bottom) * span) / size)
+        near_end = float(bottom) > 0.8 and self.end < self.index.size
+        near_start = float(top) < 0.2 and self.start > 0
+        if (near_end or near_start) and not self.shift_job:
+            self.shift_job = self.text_area.after_idle(self.shift_window)
+
+    def shift_window(self):
+        """Move the window by shift_lines towards whichever edge the view is near."""
+        self.shift_job = None
+        top, bottom = self.text_area.yview()
+        top_offset = self.top_offset()
+        if bottom > 0.8 and self.end < self.index.size:
+            self.show_window(self.index.line_start_after(self.start, self.shift_lines), top_offset)
+        elif top < 0.2 and self.start > 0:
+            self.show_window(self.index.line_start_before(self.start, self.shift_lines)[0], top_offset)
+        self.update_title()
+
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            # Jump to the line containing that fraction of the file
+            pos = int(float(args[1]) * self.index.size)
+            pos = self.data.rfind(b"\n", 0, max(pos, 0)) + 1
+            self.show_around(pos)
+        else:
+            self.text_area.yview(*args)
+
+    def show_around(self, pos):
+        start = self.index.line_start_before(pos, self.window_lines // 2)[0]
+        self.show_window(start, pos)
+        self.update_title()
+
+    def go_to_line(self, line):
+        """Show a 1-based line; returns False if the index hasn't reached it yet."""
+        pos = self.index.offset_of_line(line - 1)
+        if pos is None:
+            return False
+        self.show_around(pos)
+        return True
+
+    def update_title(self):
+        name = os.path.basename(self.path)
+        first_line = self.index.line_of_offset(self.start)
+        if first_line is None or self.index.total_lines is None:
+            position = "indexing lines..."
+            self.text_area.after(500, self.update_title_if_open)
+        else:
+            position = f"lines from {first_line + 1:,} of {self.index.total_lines:,}"
+        self.editor.root.title(f"{name} (read-only, {position}) - MuText")
+
+    def update_title_if_open(self):
+        if self.editor.large_file is self:
+            self.update_title()
+
+    def close(self):
+        self.index.cancelled = True
+        if self.shift_job:
+            self.text_area.after_cancel(self.shift_job)
+        self.scrollbar.destroy()
+        self.text_area.config(yscrollcommand=self.editor.on_view_scroll, state="normal")
+        self.editor.undo_history.enabled = True
+        self.editor.journaling = True
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.edit_modified(False)
+        self.text_area.edit_reset()
+        self.data.close()
+        self.file.close()
+
+
+class RopeLeaf:
+    __slots__ = ("text", "length", "lines", "depth")
+
+    def __init__(self, text):
+        self.text = text
+        self.length = len(text)
+        self.lines = text.count("\n")
+        self.depth = 0
+
+
+class RopeBranch:
+    __slots__ = ("left", "right", "length", "lines", "depth")
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.length = left.length + right.length
+        self.lines = left.lines + right.lines
+        self.depth = 1 + max(left.depth, right.depth)
+
+
+class Rope:
+    """
+    Immutable, height-balanced rope of text. Edits return a new rope sharing all untouched
+    nodes with the old one, so keeping a snapshot of any version costs O(1) and an edit O(log n).
+    Nodes also count newlines, which makes line <-> offset lookups O(log n).
+    """
+
+    leaf_size = 2048  # Leaves are merged up to this many characters
+
+    def __init__(self, root):
+        self.root = root
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(cls.build(text))
+
+    @classmethod
+    def build(cls, text):
+        nodes = [RopeLeaf(text[i:i + cls.leaf_size]) for i in range(0, len(text), cls.leaf_size)]
+        if not nodes:
+            return RopeLeaf("")
+        while len(nodes) > 1:
+            paired = [RopeBranch(nodes[i], nodes[i + 1]) for i in range(0, len(nodes) - 1, 2)]
+            if len(nodes) % 2:
+                paired.append(nodes[-1])
+            nodes = paired
+        return nodes[0]
+
+    def __len__(self):
+        return self.root.length
+
+    @property
+    def newlines(self):
+        return self.root.lines
+
+    def insert(self, pos, text):
+        if not text:
+            return self
+        left, right = split_rope(self.root, pos)
+        return Rope(join_rope(join_rope(left, self.build(text)), right))
+
+    def delete(self, start, end):
+        if end <= start:
+            return self
+        left, rest = split_rope(self.root, start)
+        _, right = split_rope(rest, end - start)
+        return Rope(join_rope(left, right))
+
+    def chunks(self, start=0, end=None):
+        """Yield the text between start and end leaf by leaf, without building one big string."""
+        end = self.root.length if end is None else end
+        stack = [(self.root, 0)]
+        while stack:
+            node, offset = stack.pop()
+            if offset >= end or offset + node.length <= start:
+                continue
+            if isinstance(node, RopeLeaf):
+                yield node.text[max(start - offset, 0):end - offset]
+            else:
+                stack.append((node.right, offset + node.left.length))
+                stack.append((node.left, offset))
+
+    def slice(self, start, end):
+        return "".join(self.chunks(start, end))
+
+    def text(self):
+        return "".join(self.chunks())
+
+    def line_start(self, line):
+        """Offset of the first character of a 0-based line (clamped to the last line)."""
+        if line <= 0:
+            return 0
+        if line > self.root.lines:
+            line = self.root.lines
+        node, offset = self.root, 0
+        while isinstance(node, RopeBranch):
+            if line <= node.left.lines:
+                node = node.left
+            else:
+                line -= node.left.lines
+                offset += node.left.length
+                node = node.right
+        pos = -1
+        for _ in range(line):
+            pos = node.text.index("\n", pos + 1)
+        return offset + pos + 1
+
+    def line_of(self, pos):
+        """0-based line containing offset pos."""
+        node, line = self.root, 0
+        while isinstance(node, RopeBranch):
+            if pos < node.left.length:
+                node = node.left
+            else:
+                pos -= node.left.length
+                line += node.left.lines
+                node = node.right
+        return line + node.text.count("\n", 0, pos)
+
+
+def balance_rope(left, right):
+    """Join two subtrees whose depths differ by at most two into a balanced branch."""
+    if left.depth > right.depth + 1:
+        if left.left.depth >= left.right.depth:
+            return RopeBranch(left.left, RopeBranch(left.right, right))
+        middle = left.right
+        return RopeBranch(RopeBranch(left.left, middle.left), RopeBranch(middle.right, right))
+    if right.depth > left.depth + 1:
+        if right.right.depth >= right.left.depth:
+            return RopeBranch(RopeBranch(left, right.left), right.right)
+        middle = right.left
+        return RopeBranch(RopeBranch(left, middle.left), RopeBranch(middle.right, right.right))
+    return RopeBranch(left, right)
+
+
+def join_rope(left, right):
+    """Concatenate two rope nodes, keeping the result height-balanced."""
+    if not left.length:
+        return right
+    if not right.length:
+        return left
+    if isinstance(left, RopeLeaf) and isinstance(right, RopeLeaf) and left.length + right.length <= Rope.leaf_size:
+        return RopeLeaf(left.text + right.text)
+    if left.depth > right.depth + 1:
+        return balance_rope(left.left, join_rope(left.right, right))
+    if right.depth > left.depth + 1:
+        return balance_rope(join_rope(left, right.left), right.right)
+    return RopeBranch(left, right)
+
+
+def split_rope(node, pos):
+    """Split a rope node at offset pos into (left, right) nodes."""
+    if pos <= 0:
+        return RopeLeaf(""), node
+    if pos >= node.length:
+        return node, RopeLeaf("")
+    if isinstance(node, RopeLeaf):
+        return RopeLeaf(node.text[:pos]), RopeLeaf(node.text[pos:])
+    if pos < node.left.length:
+        left, middle = split_rope(node.left, pos)
+        return left, join_rope(middle, node.right)
+    if pos == node.left.length:
+        return node.left, node.right
+    middle, right = split_rope(node.right, pos - node.left.length)
+    return join_rope(node.left, middle), right
+
+
+class DocumentModel:
+    """
+    Mirror of the Text widget's content (including Tk's trailing newline), kept in sync from
+    its insert/delete commands. Every edit bumps the version; recent edits are logged so
+    consumers can ask which ranges changed since a version they have already seen.
+    """
+
+    log_size = 4096
+
+    def __init__(self, version=0):
+        self.version = version  # Carried over when documents are swapped, so versions never repeat
+        self.rope = Rope.from_text("\n")
+        self.edits = collections.deque(maxlen=self.log_size)  # (version, start, removed, inserted)
+        self.current_snapshot = None
+
+    def insert(self, pos, text):
+        """Insert text at pos; return the offset it actually went to."""
+        pos = min(pos, len(self.rope) - 1)  # Tk never inserts after its trailing newline
+        self.rope = self.rope.insert(pos, text)
+        self.record(pos, 0, len(text))
+        return pos
+
+    def delete(self, start, end):
+        """Delete start:end; return (start, removed text), or None if nothing was removed."""
+        end = min(end, len(self.rope) - 1)  # ...nor deletes it
+        if end <= start:
+            return None
+        removed = self.rope.slice(start, end)
+        self.rope = self.rope.delete(start, end)
+        self.record(start, end - start, 0)
+        return start, removed
+
+    def tk_insert(self, index, text):
+        """Mirror "insert index chars": index is the already resolved Tk index."""
+        return self.insert(self.offset(index), text)
+
+    def tk_delete(self, first, last):
+        """
+        Mirror "delete first last" with resolved Tk indices, following Tk's rule that keeps
+        the final newline: when last is on the dummy line after it, both ends back up one
+        character (the start only if it's at the beginning of a line other than the first).
+        """
+        start, end = self.offset(first), self.offset(last)
+        if start >= end:
+            return None
+        if end >= len(self.rope):
+            end = len(self.rope) - 1
+            if first.endswith(".0") and first != "1.0":
+                start -= 1
+        return self.delete(start, end)
+
+    def reset(self, text):
+        """Replace the whole mirror, e.g. after an edit that couldn't be followed precisely."""
+        removed = len(self.rope)
+        self.rope = Rope.from_text(text)
+        self.record(0, removed, len(self.rope))
+
+    def record(self, start, removed, inserted):
+        self.version += 1
+        self.edits.append((self.version, start, removed, inserted))
+
+    def snapshot(self):
+        if self.current_snapshot is None or self.current_snapshot.version != self.version:
+            self.current_snapshot = DocumentSnapshot(self.version, self.rope)
+        return self.current_snapshot
+
+    def changed_ranges(self, since_version):
+        """
+        (start, end) ranges of the current text touched by edits after since_version, merged and sorted,
+        or None if the log no longer reaches back that far.
+        """
+        if since_version >= self.version:
+            return []
+        if not self.edits or self.edits[0][0] > since_version + 1:
+            return None
+        ranges = []
+        for version, start, removed, inserted in self.edits:
+            if version <= since_version:
+                continue
+            shifted = []
+            for range_start, range_end in ranges:
+                if range_start >= start + removed:
+                    shifted.append((range_start - removed + inserted, range_end - removed + inserted))
+                elif range_end <= start:
+                    shifted.append((range_start, range_end))
+                else:
+                    # Overlaps the edit: grow it to cover the edited span
+                    shifted.append((min(range_start, start), max(range_end - removed + inserted, start + inserted)))
+            shifted.append((start, start + inserted))
+            ranges = shifted
+        merged = []
+        for range_start, range_end in sorted(ranges):
+            if merged and range_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+            else:
+                merged.append((range_start, range_end))
+        return merged
+
+    def offset(self, index):
+        """Convert a resolved Tk "line.column" index to an offset in the mirror."""
+        line, column = index.split(".")
+        line = int(line) - 1
+        if line > self.rope.newlines:
+            return len(self.rope)
+        start = self.rope.line_start(line)
+        column = int(column)
+        text = self.rope.slice(start, start + column)
+        # Tk 8.6 counts characters outside the BMP as two columns
+        if text and max(text) > "\uffff":
+            units = 0
+            for position, char in enumerate(text):
+                if units >= column:
+                    return start + position
+                units += 2 if char > "\uffff" else 1
+        return min(start + len(text), len(self.rope))
+
+    def index(self, offset):
+        """Convert an offset in the mirror to a Tk "line.column" index (the inverse of offset)."""
+        line = self.rope.line_of(offset)
+        start = self.rope.line_start(line)
+        text = self.rope.slice(start, offset)
+        astral = sum(1 for char in text if char > "\uffff") if text and max(text) > "\uffff" else 0
+        return f"{line + 1}.{len(text) + astral}"
+
+    def index_end(self):
+        """The Tk index of end-1c according to the mirror, for consistency checks against the widget."""
+        line = self.rope.newlines
+        line_start = self.rope.line_start(line - 1)
+        last_line = self.rope.slice(line_start, len(self.rope) - 1)
+        astral = sum(1 for char in last_line if char > "\uffff")
+        return f"{line}.{len(last_line) + astral}"
+
+
+class UndoEntry:
+    """
+    One undoable step: a list of ("insert" | "delete", offset, text) operations, held either as is,
+    zlib-compressed, or spilled to the history's temp file as (position, length).
+    """
+
+    def __init__(self):
+        self.ops = []
+        self.compressed = None
+        self.spilled = None
+        self.size = 0  # Characters of text in ops
+
+
+class UndoHistory:
+    """
+    Undo/redo stacks with a memory budget, replacing the Text widget's unbounded built-in stack.
+    Recent steps are kept as is; once their text exceeds memory_budget characters the oldest are
+    compressed, once the compressed ones exceed compressed_budget bytes the oldest of those are
+    spilled to an anonymous temp file, and past spill_limit the oldest steps are dropped.
+    The newest step always stays uncompressed, so undoing even a multi-MB paste is immediate.
+    Consecutive typed characters (or Backspace/Delete presses) are merged into one step, and
+    everything recorded before close_group is called (once per Tk event) forms one step too.
+    """
+
+    memory_budget = 4 << 20
+    compressed_budget = 16 << 20
+    spill_limit = 256 << 20
+    max_entries = 10000
+
+    def __init__(self):
+        self.enabled = True
+        self.undo_stack = []
+        self.redo_stack = []
+        self.group_open = False  # Whether the next operation joins the newest step
+        self.can_merge = False  # Whether a typed character may extend the newest step
+        self.raw_size = 0
+        self.compressed_size = 0
+        self.spilled_size = 0  # Bytes of steps still in the history that live in the spill file
+        self.spill_file = None
+        self.spill_end = 0  # Length of the spill file, dropped steps included
+
+    def record(self, kind, offset, text):
+        if not self.enabled or not text:
+            return
+        redone, self.redo_stack = self.redo_stack, []
+        self.drop(redone)
+        newest = self.undo_stack[-1] if self.undo_stack else None
+        merged = newest and not self.group_open and self.can_merge and self.merge(newest, kind, offset, text)
+        if not merged:
+            if not (newest and self.group_open):
+                newest = UndoEntry()
+                self.undo_stack.append(newest)
+            newest.ops.append((kind, offset, text))
+        newest.size += len(text)
+        self.raw_size += len(text)
+        self.group_open = True
+        self.can_merge = len(text) == 1 and text != "\n"
+        self.enforce_budget()
+
+    def merge(self, entry, kind, offset, text):
+        """Extend a one-operation step with a typed or erased character next to it, if it is one."""
+        if len(entry.ops) != 1 or len(text) != 1:
+            return False
+        last_kind, last_offset, last_text = entry.ops[0]
+        if kind != last_kind or last_text.endswith("\n"):
+            return False
+        if kind == "insert" and offset == last_offset + len(last_text):
+            entry.ops[0] = (kind, last_offset, last_text + text)
+        elif kind == "delete" and offset + 1 == last_offset:  # Backspace
+            entry.ops[0] = (kind, offset, text + last_text)
+        elif kind == "delete" and offset == last_offset:  # Forward delete
+            entry.ops[0] = (kind, offset, last_text + text)
+        else:
+            return False
+        return True
+
+    def close_group(self):
+        self.group_open = False
+
+    def separator(self):
+        """Explicit boundary (Tk's "edit separator"): the next operation starts a new step."""
+        self.group_open = False
+        self.can_merge = False
+
+    def undo(self):
+        """Pop the newest step onto the redo stack and return its operations, or None."""
+        return self.move(self.undo_stack, self.redo_stack)
+
+    def redo(self):
+        return self.move(self.redo_stack, self.undo_stack)
+
+    def move(self, source, target):
+        self.separator()
+        if not source:
+            return None
+        entry = source.pop()
+        target.append(entry)
+        return self.load(entry)
+
+    def load(self, entry):
+        if entry.ops is not None:
+            return entry.ops
+        if entry.spilled:
+            position, length = entry.spilled
+            self.spill_file.seek(position)
+            return marshal.loads(zlib.decompress(self.spill_file.read(length)))
+        return marshal.loads(zlib.decompress(entry.compressed))
+
+    def reset(self):
+        self.undo_stack = []
+        self.redo_stack = []
+        self.separator()
+        self.raw_size = self.compressed_size = self.spilled_size = self.spill_end = 0
+        if self.spill_file:
+            self.spill_file.close()
+            self.spill_file = None
+
+    def enforce_budget(self):
+        stack = self.undo_stack
+        index = 0
+        while self.raw_size > self.memory_budget and index < len(stack) - 1:
+            entry = stack[index]
+            if entry.ops is not None:
+                entry.compressed = zlib.compress(marshal.dumps(entry.ops), 1)
+                entry.ops = None
+                self.raw_size -= entry.size
+                self.compressed_size += len(entry.compressed)
+            index += 1
+        index = 0
+        while self.compressed_size > self.compressed_budget and index < len(stack) - 1:
+            entry = stack[index]
+            if entry.compressed is not None:
+                self.spill(entry)
+            index += 1
+        while stack and (self.spilled_size > self.spill_limit or len(stack) > self.max_entries):
+            self.drop([stack.pop(0)])
+
+    def spill(self, entry):
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(prefix="mutext-undo-")
+        self.spill_file.seek(self.spill_end)
+        entry.spilled = (self.spill_end, len(entry.compressed))
+        self.spill_file.write(entry.compressed)
+        self.spill_end += len(entry.compressed)
+        self.compressed_size -= len(entry.compressed)
+        self.spilled_size += len(entry.compressed)
+        entry.compressed = None
+
+    def drop(self, entries):
+        for entry in entries:
+            if entry.ops is not None:
+                self.raw_size -= entry.size
+            elif entry.spilled:
+                self.spilled_size -= entry.spilled[1]
+            else:
+                self.compressed_size -= len(entry.compressed)
+        if self.spill_file and self.spilled_size * 2 < self.spill_end:
+            self.compact_spill()
+
+    def compact_spill(self):
+        """
+        Rewrite the spill file with only the steps still in the history, once most of it belongs to
+        dropped ones. Each byte is copied at most once per time the file doubles, so this stays cheap.
+        """
+        entries = sorted((entry for entry in self.undo_stack + self.redo_stack if entry.spilled),
+                         key=lambda entry: entry.spilled[0])
+        compacted = tempfile.TemporaryFile(prefix="mutext-undo-") if entries else None
+        for entry in entries:
+            position, length = entry.spilled
+            self.spill_file.seek(position)
+            entry.spilled = (compacted.tell(), length)
+            compacted.write(self.spill_file.read(length))
+        self.spill_file.close()
+        self.spill_file = compacted
+        self.spill_end = compacted.tell() if compacted else 0
+
+
+class DocumentTab:
+    """
+    One open document. Only the active tab's text lives in the Text widget; recently used tabs keep
+    their rope and undo history, and older ones are evicted down to a reference (path, cursor,
+    scroll position) plus, if they have unsaved text, that text zlib-compressed.
+    """
+
+    def __init__(self, path=None, cursor="1.0", top=0.0):
+        self.path = path
+        self.encoding = "utf-8"  # Encoding path was read in, and is written back in
+        self.cursor = cursor
+        self.top = top
+        self.modified = False
+        self.rope = None  # Text of a hydrated inactive tab
+        self.undo_history = None
+        self.compressed_text = None  # Unsaved text of an evicted tab
+        self.journal = None  # EditJournal, created when the tab is first shown; survives eviction
+        self.last_used = 0
+
+    def title(self):
+        return os.path.basename(self.path) if self.path else "Untitled"
+
+    def is_hydrated(self):
+        return self.rope is not None
+
+    def text(self):
+        """The tab's text (with Tk's trailing newline), or None if it has to be read from its file."""
+        if self.rope is not None:
+            return self.rope.text()
+        if self.compressed_text is not None:
+            return zlib.decompress(self.compressed_text).decode("utf-8", "surrogatepass")
+        return None if self.path else "\n"
+
+    def evict(self):
+        """Drop everything that can be rebuilt; only unsaved text is kept, compressed."""
+        if self.modified or not self.path:
+            self.compressed_text = zlib.compress(self.rope.text().encode("utf-8", "surrogatepass"), 1)
+        self.rope = None
+        if self.undo_history:
+            self.undo_history.reset()  # Also removes its spill file
+            self.undo_history = None
+
+
+# Lexer states at line boundaries: in text, inside a tag, in a quoted attribute value, a comment or math
+TEXT, TAG, DOUBLE_QUOTED, SINGLE_QUOTED, COMMENT, INLINE_MATH, DISPLAY_MATH = range(7)
+
+TEXT_TOKEN = re.compile(r"<!--|</?[A-Za-z][\w:.-]*|\$\$|\\\$|\$")
+TAG_TOKEN = re.compile(r"""/?>|[^\s"'<>/=]+|["']""")
+SPANS = {  # state -> (token kind, end of the span, state after it)
+    COMMENT: ("comment", re.compile(r"-->"), TEXT),
+    INLINE_MATH: ("math", re.compile(r"(?<!\\)\$"), TEXT),
+    DISPLAY_MATH: ("math", re.compile(r"(?<!\\)\$\$"), TEXT),
+    DOUBLE_QUOTED: ("value", re.compile(r'"'), TAG),
+    SINGLE_QUOTED: ("value", re.compile(r"'"), TAG),
+}
+
+
+def lex_line(line, state, tokens=None):
+    """
+    Lex one line (without its newline) starting in state; return the state at the end of it.
+    If tokens is a list, (kind, start column, end column) tuples are appended to it, with kind
+    one of "tag", "attribute", "value", "comment" and "math".
+    """
+    pos = start = 0
+    length = len(line)
+    while pos < length:
+        if state == TEXT:
+            match = TEXT_TOKEN.search(line, pos)
+            if not match:
+                break
+            token = match.group()
+            start, pos = match.span()
+            if token == "<!--":
+                state = COMMENT
+            elif token == "$$":
+                state = DISPLAY_MATH
+            elif token == "$":
+                state = INLINE_MATH
+            elif token[0] == "<":
+                state = TAG
+                if tokens is not None:
+                    tokens.append(("tag", start, pos))
+            # Anything else is an escaped \$, which is plain text
+        elif state == TAG:
+            match = TAG_TOKEN.search(line, pos)
+            if not match:
+                break
+            token = match.group()
+            start, pos = match.span()
+            if token == '"':
+                state = DOUBLE_QUOTED
+            elif token == "'":
+                state = SINGLE_QUOTED
+            elif tokens is not None:
+                tokens.append(("tag" if token[-1] == ">" else "attribute", start, pos))
+            if token[-1] == ">":
+                state = TEXT
+        else:
+            kind, end, after = SPANS[state]
+            match = end.search(line, pos)
+            pos = match.end() if match else length
+            if tokens is not None:
+                tokens.append((kind, start, pos))
+            if match:
+                state = after
+    return state
+
+
+class Highlighter:
+    """
+    Lexer state at the start of every line of the document, kept up to date on a worker thread.
+    After an edit only the changed lines are re-lexed, continuing past them just until a line
+    starts in the same state as before (usually right away); the states after that are reused.
+    One job runs at a time; edits made meanwhile are picked up together by the next job.
+    Tokens are only produced on the Tk thread, for the lines on screen.
+    """
+
+    batch_lines = 2000  # Lines fetched from the rope at a time
+
+    def __init__(self):
+        self.states = bytearray([TEXT])
+        self.version = -1  # Document version self.states describes
+        self.thread = None
+
+    def is_busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def submit(self, snapshot, changed_ranges):
+        """Bring the states up to snapshot; changed_ranges comes from DocumentModel.changed_ranges (None: relex all)."""
+        self.thread = threading.Thread(target=self.run, args=(snapshot, changed_ranges), daemon=True)
+        self.thread.start()
+
+    def run(self, snapshot, changed_ranges):
+        try:
+            self.states = self.relex(snapshot.rope, self.states, changed_ranges)
+            self.version = snapshot.version
+        except Exception as e:
+            print(f"Syntax highlighting failed: {e}")
+
+    def relex(self, rope, old_states, changed_ranges):
+        total = rope.newlines + 1
+        if changed_ranges:
+            first = rope.line_of(changed_ranges[0][0])
+            last = rope.line_of(changed_ranges[-1][1])
+        else:
+            first, last = 0, total
+            if changed_ranges is None:
+                old_states = bytearray([TEXT])  # Nothing to reuse
+        delta = total - len(old_states)  # Lines after `last` are old lines shifted by this much
+        states = old_states[:first + 1]
+        state = states[first]
+        line = first
+        while line < total - 1:
+            end = min(line + self.batch_lines, total - 1)
+            for text in rope.slice(rope.line_start(line), rope.line_start(end)).split("\n")[:end - line]:
+                state = lex_line(text, state)
+                line += 1
+                if line > last and 0 <= line - delta < len(old_states) and old_states[line - delta] == state:
+                    return states + old_states[line - delta:]  # Converged: the rest is unchanged
+                states.append(state)
+        return states
+
+
+def fts_query(text):
+    """Turn typed text into an FTS5 query matching every word as a prefix."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+class BufferStore:
+    """
+    Scratch buffer history in SQLite. The index (id, time, size, preview) is separate from the
+    bodies, which are stored once per distinct text and only read when a buffer is selected.
+    Bodies are also kept in an FTS5 full-text index, updated by triggers as buffers come and go.
+    Appends, retention and compaction run on a background thread with its own connection.
+    """
+
+    preview_length = 80
+    compact_every = 50  # Appends between retention/compaction passes
+
+    def __init__(self, path, max_entries=5000, max_age_days=0):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days  # 0 keeps buffers regardless of age
+        self.tasks = queue.Queue()
+        self.appends_since_compact = 0
+        self.thread = None
+        self.connection = self.connect()
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS bodies (digest TEXT PRIMARY KEY, body TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    preview TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+            """)
+            self.searchable = self.create_search_index()
+
+    def create_search_index(self):
+        """Set up the full-text index over bodies; returns False if this SQLite lacks FTS5."""
+        existed = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'buffer_search'"
+        ).fetchone()
+        try:
+            self.connection.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS buffer_search USING fts5(body, content='bodies');
+                CREATE TRIGGER IF NOT EXISTS bodies_insert AFTER INSERT ON bodies BEGIN
+                    INSERT INTO buffer_search (rowid, body) VALUES (new.rowid, new.body);
+                END;
+                CREATE TRIGGER IF NOT EXISTS bodies_delete AFTER DELETE ON bodies BEGIN
+                    INSERT INTO buffer_search (buffer_search, rowid, body) VALUES ('delete', old.rowid, old.body);
+                END;
+            """)
+        except sqlite3.OperationalError:
+            return False
+        if not existed:
+            # Index bodies written before the search index existed
+            self.connection.execute("INSERT INTO buffer_search (buffer_search) VALUES ('rebuild')")
+        return True
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        # auto_vacuum only takes effect on a new database, which is the only time it's needed
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execute("PRAGMA journal_mode = WAL")  # Readers aren't blocked by the writer thread
+        return connection
+
+    def migrate_json(self, json_path):
+        """Import a legacy buffer.json list once, then rename it out of the way."""
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, "r", encoding="utf-8") as buffer_file:
+                buffers = json.load(buffer_file)
+        except (json.JSONDecodeError, OSError):
+            return
+        created = os.path.getmtime(json_path) - len(buffers)
+        for i, text in enumerate(buffers):
+            self.submit("append", text, created + i)
+        self.flush()
+        os.replace(json_path, json_path + ".migrated")
+
+    def submit(self, *task):
+        self.tasks.put(task)
+        if not self.thread or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def append(self, snapshot):
+        """Queue a snapshot (DocumentSnapshot or str) to be added to the history."""
+        self.submit("append", snapshot, time.time())
+
+    def clear(self):
+        self.submit("clear")
+
+    def compact(self):
+        self.submit("compact")
+
+    def flush(self):
+        """Block until every queued task has been written."""
+        self.tasks.join()
+
+    def run(self):
+        connection = self.connect()
+        while True:
+            task = self.tasks.get()
+            try:
+                with connection:
+                    if task[0] == "append":
+                        self.write_entry(connection, task[1], task[2])
+                    elif task[0] == "clear":
+                        connection.execute("DELETE FROM entries")
+                        connection.execute("DELETE FROM bodies")
+                    elif task[0] == "compact":
+                        self.write_compaction(connection)
+                if task[0] == "compact":
+                    connection.execute("PRAGMA incremental_vacuum")
+            except sqlite3.Error as e:
+                print(f"Buffer store failed: {e}")
+            finally:
+                self.tasks.task_done()
+
+    def write_entry(self, connection, snapshot, created):
+        text = snapshot if isinstance(snapshot, str) else snapshot.text()
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        last = connection.execute("SELECT digest FROM entries ORDER BY id DESC LIMIT 1").fetchone()
+        if last and last[0] == digest:
+            return  # Same as the newest buffer
+        # Identical texts share one body
+        connection.execute("INSERT OR IGNORE INTO bodies (digest, body) VALUES (?, ?)", (digest, text))
+        preview = " ".join(text.split())[:self.preview_length]
+        connection.execute(
+            "INSERT INTO entries (created, size, digest, preview) VALUES (?, ?, ?, ?)",
+            (created, len(text), digest, preview),
+        )
+        self.appends_since_compact += 1
+        if self.appends_since_compact >= self.compact_every:
+            self.compact()
+
+    def write_compaction(self, connection):
+        """Apply the retention policy and drop bodies no entry refers to any more."""
+        self.appends_since_compact = 0
+        if self.max_entries:
+            connection.execute(
+                "DELETE FROM entries WHERE id NOT IN (SELECT id FROM entries ORDER BY id DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+        if self.max_age_days:
+            connection.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.max_age_days * 86400,))
+        connection.execute("DELETE FROM bodies WHERE digest NOT IN (SELECT digest FROM entries)")
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def entries(self):
+        """(id, created, size, preview) for every buffer, oldest first, without reading any body."""
+        return self.connection.execute("SELECT id, created, size, preview FROM entries ORDER BY id").fetchall()
+
+    def search(self, text):
+        """(id, created, size, preview) of buffers containing every word of text, newest first."""
+        query = fts_query(text)
+        if not query:
+            return self.entries()[::-1]
+        if not self.searchable:
+            pattern = f"%{text.strip()}%"
+            return self.connection.execute(
+                "SELECT entries.id, created, size, preview FROM entries JOIN bodies ON entries.digest = bodies.digest "
+                "WHERE body LIKE ? ORDER BY entries.id DESC",
+                (pattern,),
+            ).fetchall()
+        return self.connection.execute(
+            "SELECT entries.id, created, size, preview FROM buffer_search "
+            "JOIN bodies ON bodies.rowid = buffer_search.rowid JOIN entries ON entries.digest = bodies.digest "
+            "WHERE buffer_search MATCH ? ORDER BY entries.id DESC",
+            (query,),
+        ).fetchall()
+
+    def snippet(self, entry_id, text):
+        """A short excerpt of a buffer around the words of text, with matches in [brackets]."""
+        query = fts_query(text)
+        if not query or not self.searchable:
+            return None
+        row = self.connection.execute(
+            "SELECT snippet(buffer_search, 0, '[', ']', '...', 12) FROM buffer_search "
+            "JOIN bodies ON bodies.rowid = buffer_search.rowid JOIN entries ON entries.digest = bodies.digest "
+            "WHERE buffer_search MATCH ? AND entries.id = ?",
+            (query, entry_id),
+        ).fetchone()
+        return " ".join(row[0].split()) if row else None
+
+    def get(self, entry_id):
+        row = self.connection.execute(
+            "SELECT body FROM bodies JOIN entries ON entries.digest = bodies.digest WHERE entries.id = ?",
+            (entry_id,),
+        ).fetchone()
+        return row[0] if row else ""
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def read_text_files(files):
+    """Process-pool worker: return (path, mtime, size, text) for each (path, mtime, size), None text if unreadable."""
+    results = []
+    for path, mtime, size in files:
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            if b"\0" in data[:8192]:
+                text = None  # Binary file
+            else:
+                text = data.decode(detect_encoding(path), errors="replace")
+        except OSError:
+            text = None
+        results.append((path, mtime, size, text))
+    return results
+
+
+class FolderIndex:
+    """
+    Persistent full-text index (SQLite FTS5) of the text files under the quick folders and of
+    the recent files. A refresh stats the tree, re-reads only files whose mtime or size changed
+    (in a process pool), and drops files that disappeared; searching never touches the files.
+    """
+
+    extensions = (".txt", ".html", ".htm", ".md", ".tex", ".csv", ".json", ".xml", ".css", ".js", ".py")
+    max_file_size = 10 * 1024 * 1024
+    batch_size = 64  # Files per process pool task
+
+    def __init__(self, path):
+        self.path = path
+        self.thread = None
+        self.progress = None  # (files read, files to read) while a refresh runs
+        self.search_thread = None
+        self.search_result = None  # (query text, hits) of the last finished search
+        self.connection = self.connect()
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL);
+                CREATE VIRTUAL TABLE IF NOT EXISTS file_text USING fts5(body);
+            """)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode = WAL")
+        return connection
+
+    def is_refreshing(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def refresh(self, folders, files):
+        """Bring the index up to date in the background."""
+        if self.is_refreshing():
+            return
+        self.thread = threading.Thread(target=self.run_refresh, args=(folders, files), daemon=True)
+        self.thread.start()
+
+    def scan(self, folders, files):
+        """{path: (mtime, size)} of every candidate file; a stat per file, no reads."""
+        found = {}
+
+        def add(path):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return
+            if stat.st_size <= self.max_file_size:
+                found[os.path.abspath(path)] = (stat.st_mtime, stat.st_size)
+
+        for folder in folders:
+            for directory, subdirectories, names in os.walk(folder):
+                subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+                for name in names:
+                    if name.lower().endswith(self.extensions):
+                        add(os.path.join(directory, name))
+        for path in files:
+            add(path)
+        return found
+
+    def run_refresh(self, folders, files):
+        import concurrent.futures  # Only needed once a refresh actually runs, not at startup
+        import multiprocessing
+        connection = self.connect()
+        try:
+            found = self.scan(folders, files)
+            known = {path: (mtime, size, rowid) for rowid, path, mtime, size in
+                     connection.execute("SELECT rowid, path, mtime, size FROM files")}
+            with connection:
+                for path, (_, _, rowid) in known.items():
+                    if path not in found:
+                        connection.execute("DELETE FROM file_text WHERE rowid = ?", (rowid,))
+                        connection.execute("DELETE FROM files WHERE rowid = ?", (rowid,))
+            changed = [(path, mtime, size) for path, (mtime, size) in found.items()
+                       if known.get(path, (None, None))[:2] != (mtime, size)]
+            self.progress = (0, len(changed))
+            if not changed:
+                return
+            batches = [changed[i:i + self.batch_size] for i in range(0, len(changed), self.batch_size)]
+            # Spawned rather than forked: this runs on a thread of a process that owns a Tk interpreter
+            with concurrent.futures.ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+                for done, results in enumerate(pool.map(read_text_files, batches), 1):
+                    with connection:
+                        for path, mtime, size, text in results:
+                            self.store(connection, known.get(path), path, mtime, size, text)
+                    self.progress = (min(done * self.batch_size, len(changed)), len(changed))
+        except (OSError, sqlite3.Error, concurrent.futures.BrokenExecutor) as e:
+            print(f"Folder index refresh failed: {e}")
+        finally:
+            self.progress = None
+            connection.close()
+
+    def store(self, connection, known, path, mtime, size, text):
+        if known:
+            connection.execute("DELETE FROM file_text WHERE rowid = ?", (known[2],))
+            connection.execute("UPDATE files SET mtime = ?, size = ? WHERE rowid = ?", (mtime, size, known[2]))
+            rowid = known[2]
+        else:
+            rowid = connection.execute(
+                "INSERT OR REPLACE INTO files (path, mtime, size) VALUES (?, ?, ?)", (path, mtime, size)
+            ).lastrowid
+        # Unreadable files stay in files (so they aren't retried until they change) but not in file_text
+        if text is not None:
+            connection.execute("INSERT INTO file_text (rowid, body) VALUES (?, ?)", (rowid, text))
+
+    def search(self, text, max_files=100, lines_per_file=3, connection=None):
+        """Best matching files first: a list of (path, line number, line) for lines containing a query word."""
+        query = fts_query(text)
+        if not query:
+            return []
+        rows = (connection or self.connection).execute(
+            "SELECT files.path, file_text.body FROM file_text JOIN files ON files.rowid = file_text.rowid "
+            "WHERE file_text MATCH ? ORDER BY rank LIMIT ?",
+            (query, max_files),
+        )
+        patterns = [re.compile(r"\b" + re.escape(word), re.IGNORECASE) for word in re.findall(r"\w+", text)]
+        hits = []
+        for path, body in rows:  # One body in memory at a time
+            best = self.best_lines(body, patterns, lines_per_file) or [(1, "")]  # Matched across a line break
+            hits.extend((path, number, line) for number, line in best)
+        return hits
+
+    def best_lines(self, body, patterns, count, max_matches=200):
+        """
+        The count lines of body matching the most patterns, in file order. Only the lines around
+        the first max_matches matches of each pattern are looked at, found without splitting body.
+        """
+        starts = set()
+        for pattern in patterns:
+            for match in itertools.islice(pattern.finditer(body), max_matches):
+                starts.add(body.rfind("\n", 0, match.start()) + 1)
+        scored = []
+        number, counted_to = 1, 0
+        for start in sorted(starts):
+            number += body.count("\n", counted_to, start)
+            counted_to = start
+            end = body.find("\n", start)
+            line = body[start:] if end < 0 else body[start:end]
+            score = sum(1 for pattern in patterns if pattern.search(line))
+            scored.append((-score, number, line.strip()))
+        return sorted((number, line) for _, number, line in sorted(scored)[:count])
+
+    def start_search(self, text):
+        """Run search(text) on a worker thread; its hits end up in self.search_result as (text, hits)."""
+        self.search_thread = threading.Thread(target=self.run_search, args=(text,), daemon=True)
+        self.search_thread.start()
+
+    def is_searching(self):
+        return self.search_thread is not None and self.search_thread.is_alive()
+
+    def run_search(self, text):
+        connection = self.connect()
+        try:
+            self.search_result = (text, self.search(text, connection=connection))
+        except sqlite3.Error as e:
+            print(f"Folder search failed: {e}")
+            self.search_result = (text, [])
+        finally:
+            connection.close()
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+
+def character_mask(text):
+    """Bitmask of the characters in text (folded to 64 bits), to rule out fuzzy matches cheaply."""
+    mask = 0
+    for char in set(text):
+        mask |= 1 << (ord(char) & 63)
+    return mask
+
+
+class PathCatalog:
+    """Immutable, searchable list of paths, shortest first, with precomputed lowercase forms and masks."""
+
+    def __init__(self, entries):
+        entries.sort(key=lambda entry: (len(entry[0]), entry[0]))
+        self.labels = [label for label, _ in entries]
+        self.paths = [path for _, path in entries]
+        self.lower = [label.lower() for label in self.labels]
+        self.names = [label[label.rfind("/") + 1:] for label in self.lower]
+        self.masks = [character_mask(label) for label in self.lower]
+
+
+class PathIndex:
+    """
+    Cached listing of every file under the quick folders and the default open folder, for the
+    quick-open palette. The listing of each directory is kept (and saved to disk) with the
+    directory's mtime, so a refresh only re-lists directories whose entries changed.
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.directories = None  # directory -> [mtime, file names, subdirectory names]
+        self.catalog = PathCatalog([])
+        self.thread = None
+        self.last_search = None  # (catalog, query, matches), to narrow the next search as the query grows
+
+    def is_refreshing(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def refresh(self, roots):
+        """Re-list changed directories under roots, a list of (label, folder), in the background."""
+        if not self.is_refreshing():
+            self.thread = threading.Thread(target=self.run_refresh, args=(roots,), daemon=True)
+            self.thread.start()
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as cache_file:
+                return json.load(cache_file)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def run_refresh(self, roots):
+        if self.directories is None:
+            self.directories = self.load_cache()
+        directories = {}
+        entries = []
+        changed = False
+        for label, root in roots:
+            stack = [os.path.abspath(root)]
+            while stack:
+                directory = stack.pop()
+                try:
+                    mtime = os.stat(directory).st_mtime
+                except OSError:
+                    continue
+                cached = self.directories.get(directory)
+                if cached and cached[0] == mtime:
+                    files, subdirectories = cached[1], cached[2]
+                else:
+                    files, subdirectories = self.list_directory(directory)
+                    changed = True
+                directories[directory] = [mtime, files, subdirectories]
+                relative = os.path.relpath(directory, root).replace(os.sep, "/")
+                prefix = label if relative == "." else f"{label}/{relative}"
+                entries.extend((f"{prefix}/{name}", os.path.join(directory, name)) for name in files)
+                stack.extend(os.path.join(directory, name) for name in subdirectories)
+        changed = changed or len(directories) != len(self.directories)
+        self.directories = directories
+        self.catalog = PathCatalog(entries)
+        if changed:
+            try:
+                atomic_write(self.cache_path, json.dumps(directories))
+            except OSError as e:
+                print(f"Could not save the path index: {e}")
+
+    @staticmethod
+    def list_directory(directory):
+        files, subdirectories = [], []
+        try:
+            with os.scandir(directory) as scanned:
+                for entry in scanned:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        # Symlinked directories are skipped so cycles can't trap the walk
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return files, subdirectories
+
+    def search(self, query, limit=500):
+        """Indices into self.catalog of the best fuzzy matches for query, best first."""
+        catalog = self.catalog
+        query = "".join(query.lower().split())
+        if not query:
+            return list(range(min(limit, len(catalog.labels))))
+        if self.last_search and self.last_search[0] is catalog and query.startswith(self.last_search[1]):
+            candidates = self.last_search[2]  # Typing more can only remove matches
+        else:
+            candidates = range(len(catalog.labels))
+        query_mask = character_mask(query)
+        # Greedy negated classes make this a linear-time "is query a subsequence" test
+        subsequence = re.compile("".join(f"[^{re.escape(char)}]*{re.escape(char)}" for char in query))
+        masks, lower, names = catalog.masks, catalog.lower, catalog.names
+        matches = [i for i in candidates if masks[i] & query_mask == query_mask and subsequence.match(lower[i])]
+        self.last_search = (catalog, query, matches)
+        # Rank: file name starts with the query, contains it, path contains it, then any fuzzy match;
+        # each tier keeps the catalog's shortest-first order
+        results = [i for i in matches if names[i].startswith(query)]
+        if len(results) < limit:
+            results += [i for i in matches if query in names[i] and not names[i].startswith(query)]
+        if len(results) < limit:
+            results += [i for i in matches if query in lower[i] and query not in names[i]]
+        if len(results) < limit:
+            results += [i for i in matches if query not in lower[i]]
+        return results[:limit]
+
+
+class FontCatalog:
+    """
+    Sorted font families, cached on disk so the font chooser doesn't ask Tk to enumerate every
+    installed font each time it opens. The cache is keyed by the modification times of the font
+    folders, which change whenever a font is installed or removed. Preview fonts are kept in a
+    small LRU so scrolling back and forth doesn't create a new Tk font per selection.
+    """
+
+    preview_size = 16
+    max_preview_fonts = 32
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.families = None
+        self.loaded_fingerprint = None
+        self.preview_fonts = collections.OrderedDict()  # family -> tkfont.Font, least recently used first
+
+    @staticmethod
+    def font_folders():
+        home = os.path.expanduser("~")
+        if sys.platform == "darwin":
+            return ["/System/Library/Fonts", "/Library/Fonts", os.path.join(home, "Library", "Fonts")]
+        if sys.platform == "win32":
+            return [
+                os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"),
+                os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts"),
+            ]
+        return [
+            "/usr/share/fonts", "/usr/local/share/fonts",
+            os.path.join(home, ".fonts"), os.path.join(home, ".local", "share", "fonts"),
+        ]
+
+    def fingerprint(self):
+        """Modification times of the font folders and their subfolders (files aren't stat'ed)."""
+        stamps = []
+        for root in self.font_folders():
+            for folder, _, _ in os.walk(root):
+                try:
+                    stamps.append([folder, os.stat(folder).st_mtime])
+                except OSError:
+                    continue
+        return stamps
+
+    def load(self, root):
+        """The sorted family names, from memory, the disk cache, or Tk as a last resort."""
+        fingerprint = self.fingerprint()
+        if self.families is not None and fingerprint == self.loaded_fingerprint:
+            return self.families
+        self.loaded_fingerprint = fingerprint
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as cache_file:
+                cache = json.load(cache_file)
+            if cache.get("fingerprint") == fingerprint:
+                self.families = cache["families"]
+                return self.families
+        except (OSError, json.JSONDecodeError, KeyError, AttributeError):
+            pass
+        # Vertical variants ("@Name") on Windows aren't useful for editing
+        families = {family for family in tkfont.families(root) if not family.startswith("@")}
+        self.families = sorted(families, key=str.lower)
+        try:
+            atomic_write(self.cache_path, json.dumps({"fingerprint": fingerprint, "families": self.families}))
+        except OSError as e:
+            print(f"Could not save the font cache: {e}")
+        return self.families
+
+    def search(self, query):
+        """Families containing query (case-insensitive), those starting with it first."""
+        query = query.strip().lower()
+        if not query:
+            return self.families
+        lower = [(family, family.lower()) for family in self.families]
+        starts = [family for family, name in lower if name.startswith(query)]
+        return starts + [family for family, name in lower if query in name and not name.startswith(query)]
+
+    def preview_font(self, family):
+        font = self.preview_fonts.pop(family, None)
+        if font is None:
+            font = tkfont.Font(family=family, size=self.preview_size)
+            if len(self.preview_fonts) >= self.max_preview_fonts:
+                self.preview_fonts.popitem(last=False)
+        self.preview_fonts[family] = font
+        return font
+
+
+class VirtualListbox(tk.Frame):
+    """
+    Listbox that only ever holds the rows currently on screen. Rows are produced on demand by
+    get_label(index), so showing 200k items costs the same as showing 20.
+    """
+
+    def __init__(self, master, on_select=None, on_activate=None, **listbox_options):
+        super().__init__(master)
+        self.on_select = on_select
+        self.on_activate = on_activate
+        self.count = 0
+        self.get_label = None
+        self.top = 0  # Index of the first visible row
+        self.rows = 1  # Number of visible rows
+        self.line_height = None
+        self.selected = None
+        self.listbox = tk.Listbox(self, exportselection=False, activestyle="none", **listbox_options)
+        self.scrollbar = tk.Scrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.listbox.pack(side=tk.LEFT, fill="both", expand=True)
+        self.listbox.bind("<Configure>", self.on_resize)
+        self.listbox.bind("<<ListboxSelect>>", self.on_listbox_select)
+        self.listbox.bind("<Double-Button-1>", self.activate)
+        self.listbox.bind("<Return>", self.activate)
+        self.listbox.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(3))
+        self.listbox.bind("<Up>", lambda event: self.move_selection(-1))
+        self.listbox.bind("<Down>", lambda event: self.move_selection(1))
+        self.listbox.bind("<Prior>", lambda event: self.move_selection(-self.rows))
+        self.listbox.bind("<Next>", lambda event: self.move_selection(self.rows))
+
+    def set_items(self, count, get_label):
+        self.count = count
+        self.get_label = get_label
+        self.top = 0
+        self.selected = 0 if count else None
+        self.render()
+        if self.selected is not None and self.on_select:
+            self.on_select(self.selected)
+
+    def on_resize(self, event):
+        if not self.line_height:
+            self.line_height = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        rows = max(1, event.height // self.line_height)
+        if rows != self.rows:
+            self.rows = rows
+            self.render()
+
+    def render(self):
+        self.top = max(0, min(self.top, self.count - self.rows))
+        end = min(self.count, self.top + self.rows)
+        self.listbox.delete(0, tk.END)
+        for index in range(self.top, end):
+            self.listbox.insert(tk.END, self.get_label(index))
+        if self.selected is not None and self.top <= self.selected < end:
+            self.listbox.selection_set(self.selected - self.top)
+        if self.count:
+            self.scrollbar.set(self.top / self.count, end / self.count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll(self, rows):
+        self.top += rows
+        self.render()
+        return "break"
+
+    def on_mouse_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small deltas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll(-delta * 3)
+
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * self.count)
+        elif args[2] == "pages":
+            self.top += int(args[1]) * self.rows
+        else:
+            self.top += int(args[1])
+        self.render()
+
+    def on_listbox_select(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.select(self.top + selection[0])
+
+    def move_selection(self, rows):
+        if self.count:
+            self.select(max(0, min(self.count - 1, (self.selected or 0) + rows)))
+        return "break"
+
+    def select(self, index):
+        self.selected = index
+        # Scroll just enough to keep the selection visible
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.rows:
+            self.top = index - self.rows + 1
+        self.render()
+        if self.on_select:
+            self.on_select(index)
+
+    def activate(self, event=None):
+        if self.selected is not None and self.on_activate:
+            self.on_activate(self.selected)
+        return "break"
 
 
 class MuText:
@@ -26,7 +1826,12 @@ class MuText:
     # Determine the directory where the script is located
     SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
     CONFIG_FILE = os.path.join(SCRIPT_DIR, "config.json")
-    BUFFER_FILE = os.path.join(SCRIPT_DIR, "buffer.json")
+    BUFFER_FILE = os.path.join(SCRIPT_DIR, "buffer.json")  # Legacy format, imported into BUFFER_DB once
+    BUFFER_DB = os.path.join(SCRIPT_DIR, "buffers.sqlite3")
+    FOLDER_INDEX_DB = os.path.join(SCRIPT_DIR, "folder_index.sqlite3")
+    PATH_INDEX_FILE = os.path.join(SCRIPT_DIR, "path_index.json")
+    JOURNAL_FILE = os.path.join(SCRIPT_DIR, "journal-{}.jsonl")  # One per tab; "journal.jsonl" is the legacy single one
+    FONT_CACHE_FILE = os.path.join(SCRIPT_DIR, "font_cache.json")
 
     def __init__(self, root):
         self.root = root
@@ -38,19 +1843,52 @@ class MuText:
         self.font_size = 24
         self.default_open_folder = "./"
         self.current_file = None
+        self.file_encoding = "utf-8"  # Encoding current_file was read in, and is written back in
         self.recent_files = []
-        self.server_thread = None
-        self.live_preview_port = 8000
+        self.live_preview_port = 8000  # Preferred port; another free port is used if it's taken
+        self.preview_host = "localhost"  # Set to "0.0.0.0" in config.json to preview from other devices
+        self.preview_process = False  # Serve the preview from a child process
+        self.document = DocumentModel()  # Mirror of the text widget; its version is bumped on every change
+        self.preview_server = None
+        self.preview_job = None
+        self.preview_pending_since = 0.0
         self.dark_mode = False  # Dark mode is off by default
         self.autosave_enabled = True
         self.autosave_interval = 5  # Autosave every 60 seconds
         self.autosave_file_path = os.path.join(self.SCRIPT_DIR, "autosave.txt")  # Temporary autosave file
         self.unsaved_changes = False
-        self.buffer_content = []  # Initialize buffer for unsaved file content
+        self.loading = None  # State of the chunked loader while a file is being opened
+        self.large_file = None  # LargeFileView while a file above the threshold is open
+        self.large_file_threshold_mb = 64
+        self.autosave_writer = AutosaveWriter()
+        self.autosave_job = None
+        self.buffer_store = None  # History of unsaved texts, opened by load_buffer after the first paint
+        self.folder_index = None  # Full-text index of quick folders and recent files, opened on first search
+        self.path_index = None  # File listing of quick folders for the quick-open palette
+        self.font_catalog = None  # Installed font families, opened with the font chooser
+        self.buffer_max_entries = 5000
+        self.buffer_max_age_days = 0  # 0 keeps buffers regardless of age
         self.quick_folders = []  # List to store quick access folders
-
-        # Load buffer content from file
-        self.load_buffer()
+        self.syntax_highlighting = True
+        self.highlighter = Highlighter()
+        self.highlight_job = None
+        self.highlighted_view = None  # (top, bottom) of the view when it was last tagged
+        self.undo_history = UndoHistory()
+        self.journal = None  # The active tab's
+        self.journal_count = 0
+        self.tabs = []  # Open documents, see DocumentTab
+        self.active_tab = None
+        self.tab_clock = 0  # Incremented on every activation, for LRU eviction
+        self.max_live_documents = 8  # Inactive tabs kept in memory with their undo history
+        self.session = []  # Open documents saved in config.json: {"path", "cursor", "top"}
+        self.session_active = 0
+        self.undo_group_job = None
+        self.journaling = True  # Off while a file is loading or shown through a large-file window
+        self.metrics_enabled = False  # Hot-path timings for View > Performance and /metrics
+        self.lag_interval_ms = 250  # Event loop lag is measured by a heartbeat this often
+        self.lag_job = None
+        self.lag_expected = 0.0  # When the event loop lag heartbeat should next run
+        self.lag_beats = 0
 
         # Create menu bar
         self.menu_bar = tk.Menu(self.root)
@@ -65,7 +1903,7 @@ class MuText:
         self.text_area = tk.Text(
             self.root,
             wrap="word",
-            undo=True,
+            undo=False,  # Undo is handled by self.undo_history, which has a memory budget
             font=(self.current_font, self.font_size),
             insertwidth=4,
             tabs=("1c",),  # Single tuple for tab size
@@ -78,7 +1916,9 @@ class MuText:
 
         self.text_area.pack(fill="both", expand=True, padx=0, pady=0)
         self.text_area.configure(insertofftime=0)  # Prevent cursor blinking
+        self.text_area.config(yscrollcommand=self.on_view_scroll)
         self.apply_theme()
+        self.install_change_hook()
 
         # Detect unsaved changes
         self.text_area.bind("<Key>", self.mark_unsaved)
@@ -95,14 +1935,24 @@ class MuText:
         self.text_area.bind_all("<Command-n>", self.new_file)
         self.text_area.bind_all("<Command-d>", self.delete_line)  # New shortcut for deleting a line
         self.text_area.bind_all("<Command-Delete>", self.delete_entire_line)
+        self.text_area.bind_all("<Escape>", self.cancel_loading)
+        self.text_area.bind_all("<Command-l>", self.go_to_line)
+        self.text_area.bind_all("<Command-Shift-F>", self.find_in_folders)
+        self.text_area.bind_all("<Command-p>", self.quick_open)
+        self.text_area.bind_all("<Command-w>", self.close_document)
+        self.text_area.bind_all("<Control-Tab>", self.next_document)
+        self.text_area.bind_all("<Control-Shift-Tab>", self.previous_document)
         self.root.protocol("WM_DELETE_WINDOW", self.exit_editor)
 
         # File menu
         file_menu = tk.Menu(self.menu_bar, tearoff=0)
         file_menu.add_command(label="New", command=self.new_file, accelerator="Command+N")
         file_menu.add_command(label="Open", command=self.open_file, accelerator="Command+O")
+        file_menu.add_command(label="Quick Open", command=self.quick_open, accelerator="Command+P")
         file_menu.add_command(label="Save", command=self.save_file, accelerator="Command+S")
         file_menu.add_command(label="Save As", command=self.save_as_file, accelerator="Command+Shift+S")
+        file_menu.add_command(label="Cancel Loading", command=self.cancel_loading, accelerator="Escape")
+        file_menu.add_command(label="Go to Line", command=self.go_to_line, accelerator="Command+L")
         file_menu.add_separator()
         file_menu.add_command(label="Change Default Open Folder", command=self.change_open_folder)
         file_menu.add_separator()
@@ -110,13 +1960,24 @@ class MuText:
         self.menu_bar.add_cascade(label="File", menu=file_menu)
 
         # Recent Files menu
-        self.recent_files_menu = tk.Menu(self.menu_bar, tearoff=0)
-        self.update_recent_files_menu()
+        self.recent_files_menu = tk.Menu(self.menu_bar, tearoff=0)  # Filled in by finish_startup
         self.menu_bar.add_cascade(label="Recent Files", menu=self.recent_files_menu)
 
+        # Documents menu
+        self.documents_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.documents_menu.add_command(label="Next Document", command=self.next_document, accelerator="Control+Tab")
+        self.documents_menu.add_command(
+            label="Previous Document", command=self.previous_document, accelerator="Control+Shift+Tab"
+        )
+        self.documents_menu.add_command(label="Close Document", command=self.close_document, accelerator="Command+W")
+        self.documents_menu.add_separator()
+        self.menu_bar.add_cascade(label="Documents", menu=self.documents_menu)
+
         # View menu
         view_menu = tk.Menu(self.menu_bar, tearoff=0)
         view_menu.add_command(label="Toggle Dark Mode", command=self.toggle_dark_mode)
+        view_menu.add_command(label="Toggle Syntax Highlighting", command=self.toggle_syntax_highlighting)
+        view_menu.add_command(label="Performance", command=self.show_performance)
         self.menu_bar.add_cascade(label="View", menu=view_menu)
 
         # Autosave menu
@@ -130,12 +1991,15 @@ class MuText:
         self.folders_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.folders_menu.add_command(label="Add Folder", command=self.add_quick_folder)
         self.folders_menu.add_command(label="Remove Folder", command=self.remove_quick_folder)
-        self.update_folders_menu()
+        self.folders_menu.add_command(label="Find in Folders", command=self.find_in_folders, accelerator="Command+Shift+F")
         self.menu_bar.add_cascade(label="Folders", menu=self.folders_menu)
 
         # Render menu
         render_menu = tk.Menu(self.menu_bar, tearoff=0)
         render_menu.add_command(label="Render HTML", command=self.render_html, accelerator="Command+R")
+        render_menu.add_command(label="Restart Preview Server", command=self.restart_server)
+        render_menu.add_command(label="Stop Preview Server", command=self.stop_server)
+        render_menu.add_command(label="Toggle Separate Preview Process", command=self.toggle_preview_process)
         self.menu_bar.add_cascade(label="Render", menu=render_menu)
 
         # Help menu
@@ -153,41 +2017,323 @@ class MuText:
 
         self.text_area.config(font=(self.current_font, self.font_size))
 
+        # Reopen the previous session's documents as references; only the active one is loaded.
+        # A document left unsaved by a crash takes precedence if the user restores it
+        self.restore_session()
+        if not self.recover_journal():
+            self.activate_tab(self.tabs[self.session_active] if self.session_active < len(self.tabs) else self.add_tab())
+
         # Start autosave if enabled
         if self.autosave_enabled:
             self.start_autosave()
 
+        # The autosave writer counts its writes anyway, so those are only read when metrics are shown
+        METRICS.collectors.append(
+            lambda: {f"autosave_{name}": value for name, value in self.autosave_writer.stats.items()}
+        )
+        self.set_metrics_enabled(self.metrics_enabled)
+
+        # Everything the first keystroke doesn't need waits until the window has been drawn
+        self.text_area.bind("<Map>", self.on_first_map)
+
+    def on_first_map(self, event=None):
+        self.text_area.unbind("<Map>")
+        self.root.after_idle(self.finish_startup)
+
+    def finish_startup(self):
+        """Fill in the dynamic menus and open the buffer history, once the editor is on screen."""
+        self.update_recent_files_menu()
+        self.update_folders_menu()
+        self.load_buffer()
+
+    def recover_journal(self):
+        """Offer to restore the text the journals say was unsaved when MuText last stopped; True if restored."""
+        recovered = []  # (journal path, document path, text)
+        for journal_name in sorted(os.listdir(self.SCRIPT_DIR)):
+            if re.fullmatch(r"journal(-[\d-]+)?\.jsonl", journal_name):
+                journal_path = os.path.join(self.SCRIPT_DIR, journal_name)
+                result = EditJournal.recover(journal_path)
+                if result:
+                    recovered.append((journal_path,) + result)
+                else:
+                    self.remove_journal(journal_path)  # Nothing unsaved in it
+        if not recovered:
+            return False
+        names = ", ".join(os.path.basename(path) if path else "an unsaved document" for _, path, _ in recovered)
+        if not messagebox.askyesno("Recover", f"MuText didn't close properly. Restore your latest edits to {names}?"):
+            for journal_path, _, _ in recovered:
+                self.remove_journal(journal_path)
+            return False
+        for journal_path, file_path, text in recovered:
+            tab = self.find_tab(file_path) if file_path else None
+            tab = tab or self.add_tab(DocumentTab(file_path))
+            tab.rope = Rope.from_text(text)
+            tab.modified = True
+            tab.journal = EditJournal(journal_path)  # Still replays to this text until the tab is shown
+        self.activate_tab(tab)
+        self.unsaved_changes = True
+        return True
+
+    def remove_journal(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Could not remove journal {path}: {e}")
+
+    def journal_for(self, tab):
+        if not tab.journal:
+            self.journal_count += 1
+            # The process id keeps new names clear of journals restored from an earlier run
+            tab.journal = EditJournal(self.JOURNAL_FILE.format(f"{os.getpid()}-{self.journal_count}"))
+        return tab.journal
+
     def load_config(self):
         if os.path.exists(self.CONFIG_FILE):
             try:
                 with open(self.CONFIG_FILE, "r") as config_file:
                     config = json.load(config_file)
                     self.default_open_folder = config.get("default_open_folder", "./")
+                    self.current_font = config.get("current_font", self.current_font)
+                    self.font_size = config.get("font_size", self.font_size)
                     self.recent_files = config.get("recent_files", self.recent_files)
                     self.dark_mode = config.get("dark_mode", self.dark_mode)
                     self.autosave_enabled = config.get("autosave_enabled", self.autosave_enabled)
                     self.autosave_interval = config.get("autosave_interval", self.autosave_interval)
                     self.quick_folders = config.get("quick_folders", [])  # Ensure it's a list
+                    self.live_preview_port = config.get("preview_port", self.live_preview_port)
+                    self.preview_host = config.get("preview_host", self.preview_host)
+                    self.preview_process = config.get("preview_process", self.preview_process)
+                    self.large_file_threshold_mb = config.get("large_file_threshold_mb", self.large_file_threshold_mb)
+                    self.buffer_max_entries = config.get("buffer_max_entries", self.buffer_max_entries)
+                    self.buffer_max_age_days = config.get("buffer_max_age_days", self.buffer_max_age_days)
+                    self.syntax_highlighting = config.get("syntax_highlighting", self.syntax_highlighting)
+                    self.max_live_documents = config.get("max_live_documents", self.max_live_documents)
+                    self.session = config.get("open_documents", self.session)
+                    self.session_active = config.get("active_document", self.session_active)
+                    self.metrics_enabled = config.get("metrics_enabled", self.metrics_enabled)
             except json.JSONDecodeError:
                 pass
         else:
             self.save_config()
 
+    @timed("save_config", "Time to write config.json.")
     def save_config(self):
         config = {
             "default_open_folder": self.default_open_folder,
+            "current_font": self.current_font,
+            "font_size": self.font_size,
             "recent_files": self.recent_files[:10],
             "dark_mode": self.dark_mode,
             "autosave_enabled": self.autosave_enabled,
             "autosave_interval": self.autosave_interval,
             "quick_folders": self.quick_folders,  # Save quick folders as a list
+            "preview_port": self.live_preview_port,
+            "preview_host": self.preview_host,
+            "preview_process": self.preview_process,
+            "large_file_threshold_mb": self.large_file_threshold_mb,
+            "buffer_max_entries": self.buffer_max_entries,
+            "buffer_max_age_days": self.buffer_max_age_days,
+            "syntax_highlighting": self.syntax_highlighting,
+            "max_live_documents": self.max_live_documents,
+            "open_documents": self.session,
+            "active_document": self.session_active,
+            "metrics_enabled": self.metrics_enabled,
         }
         with open(self.CONFIG_FILE, "w") as config_file:
             json.dump(config, config_file)
+            METRICS.count("save_config_bytes", config_file.tell())
 
     def mark_unsaved(self, event=None):
         self.unsaved_changes = True
 
+    def install_change_hook(self):
+        """
+        Route the Text widget's edit commands through Python so every edit is seen, whatever its source.
+        A Tcl proc stands in for the widget command and sends everything else straight to the widget,
+        so errors from either path reach the caller (Tk's own bindings rely on catching them).
+        """
+        widget = self.text_area._w
+        self.text_area_command = widget + "_orig"
+        self.root.tk.call("rename", widget, self.text_area_command)
+        proxy = self.root.register(self.text_area_proxy)
+        self.root.tk.eval(f"""
+            proc {widget} {{args}} {{
+                set operation [lindex $args 0]
+                if {{$operation in {{insert delete replace}}
+                        || ($operation eq "edit" && [lindex $args 1] in {{undo redo separator reset}})}} {{
+                    lassign [{proxy} {{*}}$args] code result
+                    return -code $code $result
+                }}
+                return [{self.text_area_command} {{*}}$args]
+            }}
+        """)
+
+    def text_area_proxy(self, *args):
+        """
+        Run an edit command for the widget's Tcl proc; returns (Tcl return code, result).
+        An exception raised here would be reported by Tk's event loop rather than by the command.
+        """
+        try:
+            if args[0] == "edit":
+                return 0, self.edit_history(args[1])
+            return 0, self.mirror_edit(args)
+        except tk.TclError as e:
+            return 1, str(e)
+
+    def edit_history(self, command):
+        """Handle "edit undo/redo/separator/reset" (used by Tk's own bindings) with self.undo_history."""
+        history = self.undo_history
+        if command == "separator":
+            history.separator()
+        elif command == "reset":
+            history.reset()
+        elif history.enabled and str(self.text_area.cget("state")) != "disabled":
+            ops = history.undo() if command == "undo" else history.redo()
+            if ops is not None:
+                self.replay(ops, undo=command == "undo")
+        return ""
+
+    def replay(self, ops, undo):
+        """Apply a step's operations (or their inverses, in reverse order) to the widget."""
+        self.undo_history.enabled = False  # Don't record the replay itself
+        try:
+            for kind, offset, text in reversed(ops) if undo else ops:
+                if (kind == "insert") != undo:
+                    self.text_area.insert(self.document.index(offset), text)
+                    cursor = offset + len(text)
+                else:
+                    self.text_area.delete(self.document.index(offset), self.document.index(offset + len(text)))
+                    cursor = offset
+        finally:
+            self.undo_history.enabled = True
+        self.check_document()
+        self.text_area.mark_set("insert", self.document.index(cursor))
+        self.text_area.see("insert")
+
+    def mirror_edit(self, args):
+        """Run an insert/delete/replace on the widget and apply the same edit to self.document."""
+        call, command = self.root.tk.call, self.text_area_command
+        if str(call(command, "cget", "-state")) == "disabled":
+            return call((command,) + args)  # Tk ignores edits to a disabled widget
+
+        def index(expression):
+            return str(call(command, "index", expression))
+
+        operation = args[0]
+        if operation == "insert":
+            position = index(args[1])
+            result = call((command,) + args)
+            text = "".join(args[2::2])
+            self.record_edit("insert", self.document.tk_insert(position, text), text)
+        elif operation == "delete" and len(args) <= 3:
+            first = index(args[1])
+            last = index(args[2]) if len(args) == 3 else index(f"{args[1]} +1c")
+            result = call((command,) + args)
+            deleted = self.document.tk_delete(first, last)
+            if deleted:
+                self.record_edit("delete", *deleted)
+        else:
+            # Replace and multi-range deletes aren't used by Tk's bindings; just re-read the widget
+            result = call((command,) + args)
+            self.resync_document()
+        self.on_text_change()
+        return result
+
+    def record_edit(self, kind, offset, text):
+        """
+        Add an edit to the crash journal and the undo history. The journal gets every edit to the
+        document, undo and redo included; the undo history leaves out its own replays.
+        Edits made while handling one Tk event form one undo step.
+        """
+        if self.journaling:
+            self.journal.record(kind, offset, text)
+            if self.journal.needs_checkpoint():
+                self.journal.start(self.current_file, self.document.snapshot(), saved=False)
+        if not self.undo_history.enabled:
+            return
+        self.undo_history.record(kind, offset, text)
+        if not self.undo_group_job:
+            self.undo_group_job = self.root.after_idle(self.close_undo_group)
+
+    def close_undo_group(self):
+        self.undo_group_job = None
+        self.undo_history.close_group()
+
+    def resync_document(self):
+        self.document.reset(self.root.tk.call(self.text_area_command, "get", "1.0", "end"))
+        self.undo_history.reset()  # Its offsets may no longer line up with the text
+        self.journal.start(self.current_file, self.document.snapshot(), saved=False)
+
+    def check_document(self):
+        """Re-read the widget if the mirror's length no longer matches it (a cheap O(log n) check)."""
+        if str(self.root.tk.call(self.text_area_command, "index", "end-1c")) != self.document.index_end():
+            print("Document mirror out of sync with the text widget; re-reading it")
+            self.resync_document()
+            self.on_text_change()
+
+    def on_text_change(self):
+        if self.preview_server and self.preview_server.is_running():
+            self.schedule_preview()
+        if self.syntax_highlighting and not self.highlight_job:
+            self.highlight_job = self.root.after(20, self.update_highlight)
+
+    def on_view_scroll(self, top, bottom):
+        """yscrollcommand of the text widget: re-tag once the view settles somewhere new."""
+        if self.syntax_highlighting and not self.highlight_job and (float(top), float(bottom)) != self.highlighted_view:
+            self.highlight_job = self.root.after(20, self.update_highlight)
+
+    def update_highlight(self):
+        """Wait for the lexer to catch up with the document, then tag the lines on screen."""
+        self.highlight_job = None
+        if not self.syntax_highlighting:
+            return
+        if not self.highlighter.is_busy() and self.highlighter.version != self.document.version:
+            self.highlighter.submit(self.document.snapshot(), self.document.changed_ranges(self.highlighter.version))
+        if self.highlighter.is_busy():
+            self.highlight_job = self.root.after(20, self.update_highlight)
+            return
+        self.highlight_view()
+
+    def highlight_view(self, margin=50):
+        """Tag the visible lines plus a margin; tags elsewhere are dropped so their number stays bounded."""
+        self.highlighted_view = self.text_area.yview()
+        first = int(self.text_area.index("@0,0").split(".")[0]) - margin
+        last = int(self.text_area.index(f"@0,{self.text_area.winfo_height()}").split(".")[0]) + margin
+        first = max(first, 1)
+        states = self.highlighter.states
+        ranges = {kind: [] for kind in ("tag", "attribute", "value", "comment", "math")}
+        lines = self.text_area.get(f"{first}.0", f"{last}.0 lineend").split("\n")
+        for line_number, line in enumerate(lines, first):
+            if line_number > len(states):
+                break
+            tokens = []
+            lex_line(line, states[line_number - 1], tokens)
+            for kind, start, end in tokens:
+                ranges[kind] += (f"{line_number}.{start}", f"{line_number}.{end}")
+        for kind, indices in ranges.items():
+            self.text_area.tag_remove(f"highlight_{kind}", "1.0", "end")
+            if indices:
+                self.text_area.tag_add(f"highlight_{kind}", *indices)
+
+    def toggle_syntax_highlighting(self):
+        self.syntax_highlighting = not self.syntax_highlighting
+        self.save_config()
+        if self.syntax_highlighting:
+            self.update_highlight()
+        else:
+            for kind in ("tag", "attribute", "value", "comment", "math"):
+                self.text_area.tag_remove(f"highlight_{kind}", "1.0", "end")
+
+    def schedule_preview(self):
+        """Publish a preview snapshot once typing pauses, but at least every half second while it doesn't."""
+        if self.preview_job:
+            if time.monotonic() - self.preview_pending_since > 0.5:
+                return
+            self.root.after_cancel(self.preview_job)
+        else:
+            self.preview_pending_since = time.monotonic()
+        self.preview_job = self.root.after(100, self.publish_preview)
+
     def enable_autosave(self):
         self.autosave_enabled = True
         self.save_config()
@@ -203,45 +2349,78 @@ class MuText:
             self.autosave_interval = interval
             self.save_config()
 
+    @timed("autosave", "Time the autosave tick spends on the Tk thread; the write happens in the background.")
     def autosave(self):
-        if self.autosave_enabled:
-            if self.current_file:
-                try:
-                    with open(self.current_file, "w", encoding="utf-8") as file:
-                        file.write(self.text_area.get(1.0, tk.END))
-                except Exception as e:
-                    print(f"Autosave failed: {e}")
-            else:
-                try:
-                    with open(self.autosave_file_path, "w", encoding="utf-8") as file:
-                        file.write(self.text_area.get(1.0, tk.END))
-                except Exception as e:
-                    print(f"Autosave failed: {e}")
-            self.root.after(self.autosave_interval * 1000, self.autosave)
+        """Hand a snapshot to the background writer, but only if the text changed since the last one."""
+        self.autosave_job = None
+        if not self.autosave_enabled:
+            return
+        if self.text_area.edit_modified() and not self.loading:
+            path = self.current_file or self.autosave_file_path
+            # Reset the flag before snapshotting so edits made from here on mark the next interval dirty
+            self.text_area.edit_modified(False)
+            encoding = self.file_encoding if self.current_file else "utf-8"
+            self.autosave_writer.submit(path, self.document.snapshot(), encoding)
+        else:
+            self.autosave_writer.skip()
+        saved_tabs = False
+        for tab in self.tabs:
+            if tab is not self.active_tab and tab.modified and tab.path:
+                # Edited before being switched away from; text() is in memory for a modified tab
+                if tab.rope is not None:
+                    snapshot = DocumentSnapshot(0, rope=tab.rope)
+                else:
+                    snapshot = DocumentSnapshot(0, text=tab.text())
+                self.autosave_writer.submit(tab.path, snapshot, tab.encoding)
+                tab.modified = False
+                saved_tabs = True
+        if saved_tabs:
+            self.update_documents_menu()
+        self.autosave_job = self.root.after(self.autosave_interval * 1000, self.autosave)
 
     def start_autosave(self):
+        if self.autosave_job:
+            self.root.after_cancel(self.autosave_job)
         self.autosave()
 
     def exit_editor(self):
-        if self.unsaved_changes:
+        unsaved_tabs = [tab for tab in self.tabs if tab is not self.active_tab and tab.modified and tab.path]
+        if self.unsaved_changes or unsaved_tabs:
             choice = messagebox.askyesnocancel(
                 "Unsaved Changes",
                 "You have unsaved changes. Do you want to save them before exiting?"
             )
             if choice:  # Yes, save changes
                 self.save_file()
-                self.stop_server()  # Stop the server
-                self.save_buffer()  # Save buffer content before exiting
-                self.root.destroy()
+                for tab in unsaved_tabs:
+                    try:
+                        self.autosave_writer.cancel(tab.path)
+                        atomic_write(tab.path, tab.text(), tab.encoding)
+                    except (OSError, UnicodeError) as e:
+                        messagebox.showerror("Error", f"Could not save {tab.path}:\n{e}")
             elif choice is None:  # Cancel
                 return
+        for tab in self.tabs:
+            if tab is not self.active_tab and not tab.path and len(tab.text()) > 1:
+                self.load_buffer().append(tab.text())  # Untitled tabs aren't reopened, so keep their text
+        self.save_session()
         self.stop_server()  # Stop the server
         self.save_buffer()  # Save buffer content before exiting
+        self.autosave_writer.flush()  # Let pending autosaves land before quitting
+        for tab in self.tabs:
+            if tab.journal:
+                tab.journal.close()
         self.root.destroy()
 
     def stop_server(self):
-        if self.server_thread and self.server_thread.is_alive():
-            HTTPServer(("localhost", self.live_preview_port)).server_close()
+        if self.preview_server:
+            self.preview_server.stop()
+
+    def restart_server(self):
+        if self.preview_server and self.preview_server.is_running():
+            self.preview_server.restart()
+        else:
+            messagebox.showinfo("Preview Server", "The preview server is not running.")
 
     def update_recent_files_menu(self):
         self.recent_files_menu.delete(0, tk.END)
@@ -262,40 +2441,388 @@ class MuText:
         self.save_config()
 
     def new_file(self, event=None):
-        # Save current text to buffer before clearing
-        if not self.current_file:
-            self.buffer_content.append(self.text_area.get(1.0, tk.END))
-            self.save_buffer()  # Save buffer content immediately after adding
+        """Start an empty document in a new tab."""
+        self.activate_tab(self.add_tab())
+
+    def add_tab(self, tab=None):
+        tab = tab or DocumentTab()
+        self.tabs.append(tab)
+        return tab
+
+    def find_tab(self, file_path):
+        file_path = os.path.abspath(file_path)
+        for tab in self.tabs:
+            if tab.path and os.path.abspath(tab.path) == file_path:
+                return tab
+        return None
+
+    def stash_active_tab(self):
+        """Take the active document out of the Text widget, keeping its state in its tab."""
+        tab = self.active_tab
+        self.active_tab = None
+        if not tab:
+            return
+        if self.loading or self.large_file:
+            # A file that is still loading, or shown through the large-file view, is just reopened
+            if self.loading:
+                self.stop_loading()
+            self.close_large_file()
+            tab.rope = None
+            return
+        tab.path = self.current_file
+        tab.encoding = self.file_encoding
+        tab.cursor = self.text_area.index("insert")
+        tab.top = self.text_area.yview()[0]
+        tab.modified = self.text_area.edit_modified()  # Unsaved edits stay in the tab's journal
+        tab.rope = self.document.rope
+        tab.undo_history = self.undo_history
+        tab.compressed_text = None
+
+    def activate_tab(self, tab, line=None):
+        """Put a tab's document in the Text widget: from memory if it has its text, else from its file."""
+        if tab is self.active_tab:
+            return
+        text = tab.text()
+        checked = self.check_file(tab.path) if text is None else None
+        if text is None and not checked:
+            self.tabs.remove(tab)  # Its file is gone
+            if tab.journal:
+                tab.journal.close()
+            if not self.active_tab:
+                self.activate_tab(self.add_tab())
+            self.update_documents_menu()
+            return
+        self.stash_active_tab()
+        self.active_tab = tab
+        self.journal = self.journal_for(tab)
+        # The stashed tab took the undo history with it, and the highlighter's states describe the old text
+        self.undo_history = UndoHistory()
+        self.highlighter = Highlighter()
+        self.tab_clock += 1
+        tab.last_used = self.tab_clock
+        if text is None:
+            self.load_file(tab.path, *checked, line=line, view=(tab.cursor, tab.top))
+        else:
+            self.show_tab_text(tab, text)
+            if line:
+                self.show_line(line)
+        self.evict_idle_tabs()
+        self.update_documents_menu()
+
+    def show_tab_text(self, tab, text):
+        """Fill the widget with a tab's text, giving it a fresh mirror and its own undo history back."""
+        # Versions keep counting up from the previous document's: the preview and highlighter would
+        # otherwise take another tab's version 1 for this one's
+        self.document = DocumentModel(self.document.version)
+        self.undo_history.enabled = False  # Swapping documents isn't an edit
+        self.journaling = False
         self.text_area.delete(1.0, tk.END)
-        self.current_file = None
-        self.root.title("New File - MuText")
+        self.text_area.insert(1.0, text[:-1])  # Without the trailing newline Tk adds itself
+        self.journaling = True
+        self.undo_history = tab.undo_history or UndoHistory()
+        tab.rope = tab.undo_history = tab.compressed_text = None
+        self.current_file = tab.path
+        self.file_encoding = tab.encoding
+        self.text_area.edit_modified(tab.modified)
+        self.text_area.mark_set("insert", tab.cursor)
+        self.text_area.yview_moveto(tab.top)
+        self.journal.start(tab.path, self.document.snapshot(), saved=not tab.modified)
+        self.root.title(f"{tab.title()} - MuText")
+
+    def evict_idle_tabs(self):
+        """Keep only the max_live_documents most recently used inactive tabs in memory."""
+        live = sorted((tab for tab in self.tabs if tab.is_hydrated()), key=lambda tab: tab.last_used)
+        for tab in live[:max(len(live) - self.max_live_documents, 0)]:
+            tab.evict()
+
+    def close_document(self, event=None):
+        """Close the active tab, offering to save it first, and switch to the most recently used one."""
+        if self.text_area.edit_modified() and self.current_file and not self.loading and not self.large_file:
+            choice = messagebox.askyesnocancel("Unsaved Changes", f"Save changes to {self.active_tab.title()}?")
+            if choice:
+                self.save_file()
+            elif choice is None:
+                return
+        elif not self.current_file and not self.large_file and len(self.document.rope) > 1:
+            self.load_buffer().append(self.document.snapshot())  # Untitled text goes to the buffer history
+        tab = self.active_tab
+        self.stash_active_tab()
+        self.tabs.remove(tab)
+        tab.rope = tab.compressed_text = None
+        tab.journal.close()  # Saved, or its edits were declined
+        remaining = sorted(self.tabs, key=lambda other: other.last_used)
+        self.activate_tab(remaining[-1] if remaining else self.add_tab())
+
+    def next_document(self, event=None):
+        self.cycle_document(1)
+        return "break"
+
+    def previous_document(self, event=None):
+        self.cycle_document(-1)
+        return "break"
+
+    def cycle_document(self, step):
+        if len(self.tabs) > 1:
+            self.activate_tab(self.tabs[(self.tabs.index(self.active_tab) + step) % len(self.tabs)])
+
+    def update_documents_menu(self):
+        self.documents_menu.delete(4, tk.END)
+        for tab in self.tabs:
+            marker = "\u2022 " if tab is self.active_tab else ""
+            self.documents_menu.add_command(
+                label=f"{marker}{tab.title()}{' *' if tab.modified else ''}",
+                command=lambda t=tab: self.activate_tab(t),
+            )
+        self.save_session()
+
+    def restore_session(self):
+        for entry in self.session:
+            if os.path.isfile(entry["path"]):
+                self.add_tab(DocumentTab(entry["path"], entry.get("cursor", "1.0"), entry.get("top", 0.0)))
+
+    def save_session(self):
+        """Remember the open files (not untitled tabs) and where each was left, in config.json."""
+        session = []
+        for tab in self.tabs:
+            if tab is self.active_tab and self.current_file and not (self.loading or self.large_file):
+                session.append({
+                    "path": self.current_file,
+                    "cursor": self.text_area.index("insert"),
+                    "top": self.text_area.yview()[0],
+                })
+            elif tab.path:
+                session.append({"path": tab.path, "cursor": tab.cursor, "top": tab.top})
+            if tab is self.active_tab and session:
+                self.session_active = len(session) - 1
+        if session != self.session:
+            self.session = session
+            self.save_config()
 
-    def open_file(self, event=None, file_path=None):
+    @timed("open_file", "Time until an opened file's first chunk is on screen.")
+    def open_file(self, event=None, file_path=None, line=None):
+        """Open a file in its own tab, or switch to the tab that already has it."""
         if not file_path:
             file_path = filedialog.askopenfilename(
                 initialdir=self.default_open_folder,
                 filetypes=[("Text Files", "*.txt"), ("HTML Files", "*.html"), ("All Files", "*.*")]
             )
-        if file_path:
-            try:
-                with open(file_path, "r", encoding="utf-8") as file:
-                    self.text_area.delete(1.0, tk.END)
-                    self.text_area.insert(1.0, file.read())
-                self.current_file = file_path
-                self.root.title(f"{os.path.basename(file_path)} - MuText")
-                self.add_to_recent_files(file_path)
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not open file:\n{e}")
+        if not file_path:
+            return
+        tab = self.find_tab(file_path)
+        if tab and tab is not self.active_tab:
+            self.activate_tab(tab, line)
+        elif tab and line:
+            if self.large_file:
+                self.show_large_file_line(line)
+            elif self.loading:
+                self.loading["line"] = line
+            else:
+                self.show_line(line)
+        if tab:
+            return
+        # Checking the file here surfaces a missing or unreadable file before the current tab is put away
+        if self.check_file(file_path):
+            self.activate_tab(self.add_tab(DocumentTab(file_path)), line)
+
+    def check_file(self, file_path):
+        """(encoding, size) of a file about to be loaded, or None after telling the user why it can't be."""
+        try:
+            return detect_encoding(file_path), os.path.getsize(file_path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open file:\n{e}")
+            return None
+
+    def load_file(self, file_path, encoding, size, line=None, view=None, lossy=False):
+        """
+        Load a file into the widget chunk by chunk, then show line, or restore view (cursor, top).
+        A lossy load replaces undecodable bytes and leaves the text as an unsaved copy.
+        """
+        self.close_large_file()
+        # UTF-16 can't be split on newline bytes, so those files always take the normal path
+        if size >= self.large_file_threshold_mb * 1024 * 1024 and encoding != "utf-16":
+            self.open_large_file(file_path, encoding)
+            if line and self.large_file:
+                self.show_large_file_line(line)
+            return
+        self.journaling = False  # The journal restarts from the loaded text in finish_loading
+        # Saves write the file back in the encoding it was read in; a lossy copy is saved elsewhere, as UTF-8
+        self.file_encoding = "utf-8" if lossy else encoding
+        self.text_area.delete(1.0, tk.END)
+        self.undo_history.enabled = False  # Loading a file shouldn't be undoable chunk by chunk
+        self.loading = {
+            "path": file_path,
+            "chunks": read_chunks(file_path, encoding, errors="replace" if lossy else "strict"),
+            "encoding": encoding,
+            "lossy": lossy,
+            "size": size,
+            "edited": False,
+            "line": line,  # Line to show once loaded
+            "view": view,
+            "job": None,
+            "started": time.perf_counter(),
+        }
+        self.load_next_chunk()
+
+    def load_next_chunk(self):
+        """Insert the next chunk of the file being opened, then yield to the event loop."""
+        loading = self.loading
+        loading["job"] = None
+        # The first screen is editable right away: note whether the user typed since the last chunk
+        if self.text_area.edit_modified():
+            loading["edited"] = True
+        deadline = time.monotonic() + 0.02  # Keep each tick short so typing and scrolling stay responsive
+        try:
+            while time.monotonic() < deadline:
+                chunk, done = next(loading["chunks"])
+                self.text_area.insert("end-1c", chunk)
+        except StopIteration:
+            self.finish_loading()
+            return
+        except UnicodeDecodeError:
+            self.reload_with_fallback()
+            return
+        except Exception as e:
+            self.stop_loading()
+            self.root.title(f"{os.path.basename(loading['path'])} (partial) - MuText")
+            messagebox.showerror("Error", f"Could not open file:\n{e}")
+            return
+        self.text_area.edit_modified(False)
+        percent = 100 * done // max(loading["size"], 1)
+        self.root.title(f"Loading {os.path.basename(loading['path'])}: {percent}% (Escape to cancel) - MuText")
+        loading["job"] = self.root.after(1, self.load_next_chunk)
+
+    def reload_with_fallback(self):
+        """
+        The file stopped decoding past the sample detect_encoding checked. Start over in Latin-1,
+        which reads any bytes, and is then also used to save, so they are written back unchanged;
+        UTF-16 has no such fallback, so it is read with replacement characters instead, as a copy
+        that can't be saved over the file.
+        """
+        loading = self.loading
+        self.stop_loading()
+        if loading["encoding"] == "utf-16":
+            self.load_file(loading["path"], "utf-16", loading["size"], loading["line"], loading["view"], lossy=True)
+        else:
+            self.load_file(loading["path"], "latin-1", loading["size"], loading["line"], loading["view"])
+        if loading["edited"]:
+            messagebox.showwarning(
+                "Reloaded", "The file had to be read again in another encoding; edits made while it loaded were lost."
+            )
+
+    def finish_loading(self):
+        file_path = self.loading["path"]
+        edited = self.loading["edited"]
+        line = self.loading["line"]
+        view = self.loading["view"]
+        lossy = self.loading["lossy"]
+        METRICS.observe("file_load", time.perf_counter() - self.loading["started"])
+        METRICS.count("file_load_bytes", self.loading["size"])
+        self.stop_loading()
+        self.text_area.edit_modified(edited)
+        if lossy:
+            # Like a cancelled load: never save the damaged text over the original file
+            self.current_file = None
+            self.journal.start(None, self.document.snapshot(), saved=False)
+            self.root.title(f"{os.path.basename(file_path)} (read with errors) - MuText")
+            messagebox.showwarning(
+                "Encoding Errors",
+                "Parts of this file couldn't be decoded and were replaced. It is open as an unsaved copy.",
+            )
+        else:
+            self.current_file = file_path
+            self.journal.start(file_path, self.document.snapshot(), saved=not edited)
+            self.root.title(f"{os.path.basename(file_path)} - MuText")
+        self.add_to_recent_files(file_path)
+        if line:
+            self.show_line(line)
+        elif view:
+            self.text_area.mark_set("insert", view[0])
+            self.text_area.yview_moveto(view[1])
+
+    def stop_loading(self):
+        if self.loading["job"]:
+            self.root.after_cancel(self.loading["job"])
+        self.loading["chunks"].close()
+        self.loading = None
+        self.undo_history.enabled = True
+        self.journaling = True
+        self.text_area.edit_reset()
+
+    def cancel_loading(self, event=None):
+        """Stop a file load in progress, keeping what was loaded so far as an unsaved document."""
+        if not self.loading:
+            return
+        file_path = self.loading["path"]
+        self.stop_loading()
+        self.current_file = None  # Never save the partial text over the original file
+        self.journal.start(None, self.document.snapshot(), saved=False)
+        self.root.title(f"{os.path.basename(file_path)} (partial) - MuText")
+
+    def open_large_file(self, file_path, encoding):
+        """Show a file too large for the Text widget through a memory-mapped, windowed view."""
+        self.text_area.delete(1.0, tk.END)
+        try:
+            self.large_file = LargeFileView(self, file_path, encoding)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open file:\n{e}")
+            return
+        # current_file stays unset so autosave and save never write the window back over the file
+        self.current_file = None
+        self.journal.start(None, self.document.snapshot(), saved=True)
+        self.add_to_recent_files(file_path)
+
+    def close_large_file(self):
+        if self.large_file:
+            self.large_file.close()
+            self.large_file = None
+
+    def go_to_line(self, event=None):
+        line = simpledialog.askinteger("Go to Line", "Line number:", minvalue=1)
+        if not line:
+            return
+        if self.large_file:
+            if not self.large_file.go_to_line(line):
+                messagebox.showinfo("Go to Line", "That line hasn't been indexed yet. Try again in a moment.")
+            return
+        self.show_line(line)
+
+    def show_line(self, line):
+        self.text_area.mark_set("insert", f"{line}.0")
+        self.text_area.see("insert")
+        self.text_area.focus_set()
+
+    def show_large_file_line(self, line, attempts=20):
+        """Jump to a line of the large file view, waiting for the line index to get there."""
+        if self.large_file and not self.large_file.go_to_line(line) and attempts:
+            self.root.after(250, self.show_large_file_line, line, attempts - 1)
 
     def confirm_and_open_recent(self, file_path):
         if messagebox.askyesno("Confirm", f"Open recent file:\n{file_path}?"):
             self.open_file(file_path=file_path)
 
+    @timed("save_file", "Time to write the current document to its file.")
     def save_file(self, event=None):
+        if self.loading:
+            messagebox.showwarning("Still Loading", "Wait for the file to finish loading, or cancel it first.")
+            return
+        if self.large_file:
+            messagebox.showinfo("Read-Only", "Large files are opened read-only.")
+            return
         if self.current_file:
             try:
-                with open(self.current_file, "w", encoding="utf-8") as file:
-                    file.write(self.text_area.get(1.0, tk.END))
+                self.check_document()
+                content = self.document.snapshot().text()
+                encoding = self.writable_encoding(content)
+                if not encoding:
+                    return
+                self.autosave_writer.cancel(self.current_file)
+                with open(self.current_file, "w", encoding=encoding) as file:
+                    file.write(content)
+                if METRICS.enabled:
+                    METRICS.count("save_file_bytes", os.path.getsize(self.current_file))
+                self.text_area.edit_modified(False)
+                self.autosave_writer.remember(self.current_file, content, encoding)
+                self.journal.start(self.current_file, self.document.snapshot(), saved=True)
                 self.root.title(f"{os.path.basename(self.current_file)} - MuText")
                 self.add_to_recent_files(self.current_file)
             except Exception as e:
@@ -304,6 +2831,12 @@ class MuText:
             self.save_as_file()
 
     def save_as_file(self, event=None):
+        if self.loading:
+            messagebox.showwarning("Still Loading", "Wait for the file to finish loading, or cancel it first.")
+            return
+        if self.large_file:
+            messagebox.showinfo("Read-Only", "Large files are opened read-only.")
+            return
         default_filename = datetime.now().strftime("%Y-%m-%d.txt")
         file_path = filedialog.asksaveasfilename(
             initialdir=self.default_open_folder,
@@ -313,14 +2846,38 @@ class MuText:
         )
         if file_path:
             try:
-                with open(file_path, "w", encoding="utf-8") as file:
-                    file.write(self.text_area.get(1.0, tk.END))
+                self.check_document()
+                content = self.document.snapshot().text()
+                encoding = self.writable_encoding(content)
+                if not encoding:
+                    return
+                self.autosave_writer.cancel(file_path)
+                with open(file_path, "w", encoding=encoding) as file:
+                    file.write(content)
+                self.text_area.edit_modified(False)
+                self.autosave_writer.remember(file_path, content, encoding)
                 self.current_file = file_path
+                self.journal.start(file_path, self.document.snapshot(), saved=True)
+                self.update_documents_menu()
                 self.root.title(f"{os.path.basename(file_path)} - MuText")
                 self.add_to_recent_files(file_path)
             except Exception as e:
                 messagebox.showerror("Error", f"Could not save file:\n{e}")
 
+    def writable_encoding(self, text):
+        """The encoding to save text in: the file's own, or UTF-8 if the user agrees when text no longer fits it."""
+        if not self.file_encoding.startswith("utf"):  # UTF encodings can write any text
+            try:
+                text.encode(self.file_encoding)
+            except UnicodeEncodeError:
+                if not messagebox.askyesno(
+                    "Encoding",
+                    f"This document has characters that can't be written in {self.file_encoding}. Save it as UTF-8?",
+                ):
+                    return None
+                self.file_encoding = "utf-8"
+        return self.file_encoding
+
     def change_open_folder(self):
         folder = filedialog.askdirectory(initialdir=self.default_open_folder)
         if folder:
@@ -336,49 +2893,135 @@ class MuText:
     def apply_theme(self):
         if self.dark_mode:
             self.text_area.config(bg="#111212", fg="white", insertbackground="white")
+            colors = {
+                "tag": "#6cb6ff", "attribute": "#d2a8ff", "value": "#7ee787", "comment": "#8b949e", "math": "#ffa657",
+            }
         else:
             self.text_area.config(bg="white", fg="black", insertbackground="black")
+            colors = {
+                "tag": "#1f5fbf", "attribute": "#8a4baf", "value": "#2e7d32", "comment": "#8c8c8c", "math": "#b35c00",
+            }
+        for kind, color in colors.items():
+            self.text_area.tag_configure(f"highlight_{kind}", foreground=color)
+            self.text_area.tag_lower(f"highlight_{kind}", "sel")  # Keep the selection readable
 
     def render_html(self, event=None):
         """Render the current text in a local web server with KaTeX support, then open it in a browser."""
         if not messagebox.askyesno("Confirm Render", "Are you sure you want to render the HTML?"):
             return
 
-        class LivePreviewHandler(BaseHTTPRequestHandler):
-            def do_GET(self):
-                self.send_response(200)
-                self.send_header("Content-type", "text/html")
-                self.end_headers()
-                html_content = self.server.editor_instance.text_area.get(1.0, tk.END)
-                katex_head = """
-                <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/katex@0.16.19/dist/katex.min.css">
-                <script defer src="https://cdn.jsdelivr.net/npm/katex@0.16.19/dist/katex.min.js"></script>
-                <script defer src="https://cdn.jsdelivr.net/npm/katex@0.16.19/dist/contrib/auto-render.min.js"
-                        onload="renderMathInElement(document.body);"></script>
-                <script>
-                setInterval(() => {
-                    fetch(window.location.href)
-                        .then(response => response.text())
-                        .then(html => {
-                            document.body.innerHTML = html;
-                            renderMathInElement(document.body);
-                        });
-                }, 4000);  // Refresh automatically
-                </script>
-                """
-                full_html = f"<!DOCTYPE html><html><head>{katex_head}</head><body>{html_content}</body></html>"
-                self.wfile.write(full_html.encode("utf-8"))
-
-        def start_server():
-            server = HTTPServer(("localhost", self.live_preview_port), LivePreviewHandler)
-            server.editor_instance = self
-            server.serve_forever()
-
-        if not self.server_thread or not self.server_thread.is_alive():
-            self.server_thread = threading.Thread(target=start_server, daemon=True)
-            self.server_thread.start()
-
-        webbrowser.open_new(f"http://localhost:{self.live_preview_port}")
+        # Imported here rather than at startup: the server pulls in http.server and friends
+        import webbrowser
+        from mutext_preview import KatexAssets, PreviewDocument, PreviewServer, PreviewProcess
+
+        katex_folder = os.path.join(self.SCRIPT_DIR, "katex")
+        if not self.preview_server and self.preview_process:
+            self.preview_server = PreviewProcess(self.preview_host, self.live_preview_port, katex_folder)
+        elif not self.preview_server:
+            preview_document = PreviewDocument()
+            self.preview_server = PreviewServer(preview_document, self.preview_host, self.live_preview_port)
+            # Serve KaTeX from the local bundle when it has been fetched, otherwise fall back to the CDN
+            katex_assets = KatexAssets(katex_folder)
+            if katex_assets.available():
+                preview_document.set_katex_base(katex_assets.base_url())
+                self.preview_server.katex_assets = katex_assets
+        try:
+            self.preview_server.start()
+            self.publish_preview()
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not start the preview server:\n{e}")
+            return
+
+        webbrowser.open_new(self.preview_server.url())
+
+    def publish_preview(self):
+        """Hand the current snapshot to the preview server (runs on the Tk thread)."""
+        self.preview_job = None
+        snapshot = self.document.snapshot()
+        self.preview_server.publish(snapshot.version, snapshot)
+
+    def toggle_preview_process(self):
+        """Switch between serving the preview from a thread and from a separate process."""
+        self.preview_process = not self.preview_process
+        self.save_config()
+        was_running = self.preview_server and self.preview_server.is_running()
+        self.stop_server()
+        self.preview_server = None
+        mode = "a separate process" if self.preview_process else "the editor process"
+        if was_running:
+            mode += ". Render again to reopen the preview"
+        messagebox.showinfo("Preview Server", f"The preview will be served from {mode}.")
+
+    def set_metrics_enabled(self, enabled):
+        """Start or stop recording hot-path metrics and the event loop lag heartbeat."""
+        self.metrics_enabled = METRICS.enabled = enabled
+        if enabled and not self.lag_job:
+            self.lag_expected = time.perf_counter() + self.lag_interval_ms / 1000
+            self.lag_job = self.root.after(self.lag_interval_ms, self.measure_event_loop_lag)
+        elif not enabled and self.lag_job:
+            self.root.after_cancel(self.lag_job)
+            self.lag_job = None
+        if not enabled and self.preview_process and self.preview_server:
+            self.preview_server.publish_metrics(None)
+
+    def measure_event_loop_lag(self):
+        """Heartbeat: how late the Tk event loop ran a timer is how long it was busy with something else."""
+        now = time.perf_counter()
+        lag = max(0.0, now - self.lag_expected)
+        METRICS.observe("event_loop_lag", lag)
+        METRICS.set_gauge("event_loop_lag_last_seconds", round(lag, 6))
+        self.lag_beats += 1
+        if self.preview_process and self.preview_server and self.lag_beats % 4 == 0:
+            # A preview process has its own registry, so it is sent the editor's metrics about once a second
+            self.preview_server.publish_metrics(METRICS.prometheus())
+        self.lag_expected = now + self.lag_interval_ms / 1000
+        self.lag_job = self.root.after(self.lag_interval_ms, self.measure_event_loop_lag)
+
+    def show_performance(self):
+        """Live table of the hot-path metrics, refreshed every second while the window is open."""
+        previous = {}  # counter -> (total, time) at the last refresh, for rates
+
+        def toggle():
+            self.set_metrics_enabled(enabled_var.get())
+            self.save_config()
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            timings, counters, gauges = METRICS.snapshot()
+            now = time.monotonic()
+            lines = [] if METRICS.enabled else ["Collection is off; turn it on to record timings.", ""]
+            lines.append(f"{'Timing':<32}{'count':>8}{'mean ms':>10}{'max ms':>10}")
+            for name, (count, total, longest) in sorted(timings.items()):
+                lines.append(f"{name:<32}{count:>8}{total / count * 1000:>10.2f}{longest * 1000:>10.2f}")
+            lines += ["", f"{'Counter':<32}{'total':>14}{'per s':>12}"]
+            for name, total in sorted(counters.items()):
+                before = previous.get(name)
+                rate = (total - before[0]) / (now - before[1]) if before and now > before[1] else 0.0
+                previous[name] = (total, now)
+                lines.append(f"{name:<32}{total:>14}{rate:>12.1f}")
+            lines += ["", f"{'Gauge':<32}{'value':>14}"]
+            lines += [f"{name:<32}{value:>14}" for name, value in sorted(gauges.items())]
+            table.config(state=tk.NORMAL)
+            table.delete(1.0, tk.END)
+            table.insert(1.0, "\n".join(lines))
+            table.config(state=tk.DISABLED)
+            window.after(1000, refresh)
+
+        window = tk.Toplevel(self.root)
+        window.title("Performance")
+        window.geometry("640x480")
+
+        controls = tk.Frame(window)
+        controls.pack(fill="x", padx=10, pady=(10, 0))
+        enabled_var = tk.BooleanVar(value=METRICS.enabled)
+        tk.Checkbutton(controls, text="Collect metrics", variable=enabled_var, command=toggle).pack(side=tk.LEFT)
+        tk.Button(controls, text="Reset", command=METRICS.reset).pack(side=tk.RIGHT)
+
+        table = tk.Text(window, font=("Courier", 12), wrap="none", state=tk.DISABLED)
+        table.pack(fill="both", expand=True, padx=10, pady=10)
+
+        refresh()
 
     def show_about(self):
         messagebox.showinfo(
@@ -395,118 +3038,171 @@ class MuText:
     def increase_font_size(self, event=None):
         self.font_size += 4
         self.text_area.config(font=(self.current_font, self.font_size))
+        self.save_config()
 
     def decrease_font_size(self, event=None):
         if self.font_size > 6:
             self.font_size -= 2
             self.text_area.config(font=(self.current_font, self.font_size))
+            self.save_config()
 
     def reset_font_size(self, event=None):
         self.font_size = 16
         self.text_area.config(font=(self.current_font, self.font_size))
+        self.save_config()
 
     def choose_font(self):
         """
-        Open a font selection window where users can preview and select a font.
+        Open a font selection window where users can filter, preview and select a font.
         """
-        def preview_font(event):
-            # Get the selected font from the listbox and update the preview label
-            selected_font = font_listbox.get(font_listbox.curselection())
-            preview_label.config(text=f"Preview: {selected_font}", font=(selected_font, 16))
+        if not self.font_catalog:
+            self.font_catalog = FontCatalog(self.FONT_CACHE_FILE)
+        self.font_catalog.load(self.root)
+        results = []
 
-        def apply_font():
+        def preview_font(index):
+            # Update the preview label with the highlighted font
+            selected_font = results[index]
+            preview_label.config(text=f"Preview: {selected_font}", font=self.font_catalog.preview_font(selected_font))
+
+        def apply_font(index=None):
             # Set the selected font as the current font and apply it to the text area
-            self.current_font = font_listbox.get(font_listbox.curselection())
-            self.text_area.config(font=(self.current_font, self.font_size))
-            font_window.destroy()
+            if results and font_list.selected is not None:
+                self.current_font = results[font_list.selected]
+                self.text_area.config(font=(self.current_font, self.font_size))
+                self.save_config()
+                font_window.destroy()
+
+        def filter_fonts(*args):
+            results[:] = self.font_catalog.search(filter_var.get())
+            font_list.set_items(len(results), results.__getitem__)
 
         # Create the font selection window
         font_window = tk.Toplevel(self.root)
         font_window.title("Choose Font")
-        font_window.geometry("400x300")
-
-        # Listbox to display fonts
-        fonts = sorted(tkfont.families())
-        font_listbox = tk.Listbox(font_window, height=15, exportselection=False)
-        for font in fonts:
-            font_listbox.insert(tk.END, font)
-        font_listbox.pack(fill="both", expand=True, padx=10, pady=10)
-        font_listbox.bind("<<ListboxSelect>>", preview_font)
-
-        # Preview label to show selected font
-        preview_label = tk.Label(font_window, text=f"Preview: {self.current_font}", font=(self.current_font, 16))
-        preview_label.pack(pady=10)
+        font_window.geometry("400x360")
+
+        # Type-ahead filter
+        filter_var = tk.StringVar()
+        filter_entry = tk.Entry(font_window, textvariable=filter_var)
+        filter_entry.pack(fill="x", padx=10, pady=(10, 0))
+        filter_entry.bind("<Down>", lambda event: font_list.move_selection(1))
+        filter_entry.bind("<Up>", lambda event: font_list.move_selection(-1))
+        filter_entry.bind("<Return>", apply_font)
+        filter_entry.bind("<Escape>", lambda event: font_window.destroy())
+        filter_entry.focus_set()
+        filter_var.trace_add("write", filter_fonts)
 
         # Buttons to apply or close the font selection window
         button_frame = tk.Frame(font_window)
-        button_frame.pack(pady=10)
+        button_frame.pack(side=tk.BOTTOM, pady=10)
         apply_button = tk.Button(button_frame, text="Apply Font", command=apply_font)
         apply_button.pack(side=tk.LEFT, padx=5)
         close_button = tk.Button(button_frame, text="Close", command=font_window.destroy)
         close_button.pack(side=tk.LEFT, padx=5)
 
+        # Preview label to show the highlighted font
+        preview_label = tk.Label(
+            font_window, text=f"Preview: {self.current_font}", font=(self.current_font, FontCatalog.preview_size)
+        )
+        preview_label.pack(side=tk.BOTTOM, pady=10)
+
+        # Only the visible rows are ever in the listbox
+        font_list = VirtualListbox(font_window, on_select=preview_font, on_activate=apply_font, height=15)
+        font_list.pack(fill="both", expand=True, padx=10, pady=10)
+
+        filter_fonts()
+        if self.current_font in results:
+            font_list.select(results.index(self.current_font))
+
+    @timed("save_buffer", "Time spent waiting for queued buffer history writes.")
     def save_buffer(self):
-        """Save buffer content to a file."""
-        with open(self.BUFFER_FILE, "w", encoding="utf-8") as buffer_file:
-            json.dump(self.buffer_content, buffer_file)
+        """Wait for queued buffer writes to reach the disk."""
+        if self.buffer_store:
+            self.buffer_store.flush()
 
     def load_buffer(self):
-        """Load buffer content from a file."""
-        if os.path.exists(self.BUFFER_FILE):
-            try:
-                with open(self.BUFFER_FILE, "r", encoding="utf-8") as buffer_file:
-                    self.buffer_content = json.load(buffer_file)
-            except json.JSONDecodeError:
-                self.buffer_content = []
+        """Open the buffer store if it isn't yet, importing buffer.json the first time; returns it."""
+        if not self.buffer_store:
+            self.buffer_store = BufferStore(self.BUFFER_DB, self.buffer_max_entries, self.buffer_max_age_days)
+            self.buffer_store.migrate_json(self.BUFFER_FILE)
+            self.buffer_store.compact()  # Apply the retention policy in the background
+        return self.buffer_store
 
     def clear_buffer(self):
         """Clear the buffer content with confirmation."""
         if messagebox.askyesno("Confirm Clear Buffer", "Are you sure you want to clear the buffer?"):
-            self.buffer_content.clear()
+            self.load_buffer().clear()
             self.save_buffer()
             messagebox.showinfo("Buffer Cleared", "The buffer content has been cleared.")
 
     def load_from_buffer(self):
         """Load content from buffer into the text area."""
-        if not self.buffer_content:
+        self.save_buffer()  # Include buffers still being written
+        if not self.load_buffer().count():
             messagebox.showinfo("No Buffer Content", "There is no content in the buffer.")
             return
-
-        def load_selected_buffer():
-            selected_index = buffer_listbox.curselection()
-            if selected_index:
-                # Save current file if it exists
-                if self.current_file:
-                    self.save_file()
-                # Clear text area and load buffer content
-                self.text_area.delete(1.0, tk.END)
-                self.text_area.insert(1.0, self.buffer_content[selected_index[0]])
-                self.current_file = None  # Set to unsaved state
-                self.root.title("Unsaved File - MuText")
+        results = []
+        search_job = None
+
+        def load_selected_buffer(index=None):
+            if buffer_list.selected is not None:
+                # The buffer opens as a new unsaved document in its own tab
+                tab = self.add_tab()
+                tab.rope = Rope.from_text(self.buffer_store.get(results[buffer_list.selected][0]) + "\n")
+                tab.modified = True
+                self.activate_tab(tab)
                 buffer_window.destroy()
 
-        def show_preview(event):
-            selected_index = buffer_listbox.curselection()
-            if selected_index:
-                preview_text.delete(1.0, tk.END)
-                preview_text.insert(1.0, self.buffer_content[selected_index[0]])
+        def show_preview(index):
+            preview_text.delete(1.0, tk.END)
+            preview_text.insert(1.0, self.buffer_store.get(results[index][0]))
+
+        def label(index):
+            # Only called for rows on screen, so snippets are computed for a handful of buffers at most
+            entry_id, created, _, preview = results[index]
+            snippet = self.buffer_store.snippet(entry_id, search_var.get()) or preview
+            return f"{datetime.fromtimestamp(created):%Y-%m-%d %H:%M}  {snippet}"
+
+        def run_search():
+            nonlocal search_job
+            search_job = None
+            results[:] = self.buffer_store.search(search_var.get())
+            preview_text.delete(1.0, tk.END)
+            buffer_list.set_items(len(results), label)
+            buffer_window.title(f"Select Buffer Content ({len(results)} found)")
+
+        def on_search_change(*args):
+            nonlocal search_job
+            if search_job:
+                buffer_window.after_cancel(search_job)
+            search_job = buffer_window.after(30, run_search)
 
         # Create a window to select buffer content
         buffer_window = tk.Toplevel(self.root)
         buffer_window.title("Select Buffer Content")
-        buffer_window.geometry("600x400")
+        buffer_window.geometry("900x500")
+
+        search_var = tk.StringVar()
+        search_entry = tk.Entry(buffer_window, textvariable=search_var)
+        search_entry.pack(fill="x", padx=10, pady=(10, 0))
+        search_entry.bind("<Down>", lambda event: buffer_list.listbox.focus_set())
+        search_entry.bind("<Return>", load_selected_buffer)
+        search_entry.focus_set()
+        search_var.trace_add("write", on_search_change)
+
+        load_button = tk.Button(buffer_window, text="Load Selected", command=load_selected_buffer)
+        load_button.pack(side=tk.BOTTOM, pady=10)
 
-        buffer_listbox = tk.Listbox(buffer_window, height=15)
-        for i, content in enumerate(self.buffer_content):
-            buffer_listbox.insert(tk.END, f"Buffer {i+1}")
-        buffer_listbox.pack(side=tk.LEFT, fill="y", padx=10, pady=10)
-        buffer_listbox.bind("<<ListboxSelect>>", show_preview)
+        buffer_list = VirtualListbox(
+            buffer_window, on_select=show_preview, on_activate=load_selected_buffer, width=50
+        )
+        buffer_list.pack(side=tk.LEFT, fill="both", expand=True, padx=10, pady=10)
 
         preview_text = tk.Text(buffer_window, wrap="word", height=15, width=40)
         preview_text.pack(side=tk.RIGHT, fill="both", expand=True, padx=10, pady=10)
 
-        load_button = tk.Button(buffer_window, text="Load Selected", command=load_selected_buffer)
-        load_button.pack(pady=10)
+        run_search()
 
     def create_buffer_menu(self):
         """Create a menu for buffer operations."""
@@ -573,8 +3269,8 @@ class MuText:
         """Update the folders menu with quick access folders."""
         # Clear existing folder entries
         menu_length = self.folders_menu.index(tk.END)
-        if menu_length is not None and menu_length >= 2:
-            self.folders_menu.delete(2, tk.END)  # Keep the "Add Folder" and "Remove Folder" options
+        if menu_length is not None and menu_length >= 3:
+            self.folders_menu.delete(3, tk.END)  # Keep the "Add Folder", "Remove Folder" and "Find in Folders" options
 
         for name, folder in self.quick_folders:
             self.folders_menu.add_command(
@@ -582,6 +3278,151 @@ class MuText:
                 command=lambda f=folder: self.open_file_from_folder(f)
             )
 
+    def find_in_folders(self, event=None):
+        """Search the text of every file in the quick folders and recent files, and open a hit at its line."""
+        if not self.folder_index:
+            self.folder_index = FolderIndex(self.FOLDER_INDEX_DB)
+        folders = [folder for _, folder in self.quick_folders]
+        self.folder_index.refresh(folders, self.recent_files)
+        self.folder_index.search_result = None
+        hits = []
+        search_job = None
+
+        def open_hit(index=None):
+            if hits and results_list.selected is not None:
+                path, line, _ = hits[results_list.selected]
+                find_window.destroy()
+                self.open_file(file_path=path, line=line)
+
+        def label(index):
+            path, line, text = hits[index]
+            return f"{os.path.basename(path)}:{line}  {text}"
+
+        def run_search():
+            # One search at a time on the index's worker; typing meanwhile just moves the target
+            nonlocal search_job
+            search_job = None
+            if not find_window.winfo_exists():
+                return
+            wanted = search_var.get()
+            result = self.folder_index.search_result
+            if result and result[0] == wanted:
+                hits[:] = result[1]
+                results_list.set_items(len(hits), label)
+                return
+            if not self.folder_index.is_searching():
+                self.folder_index.start_search(wanted)
+            search_job = find_window.after(30, run_search)
+
+        def on_search_change(*args):
+            nonlocal search_job
+            if search_job:
+                find_window.after_cancel(search_job)
+            search_job = find_window.after(100, run_search)
+
+        def show_path(index):
+            status_label.config(text=hits[index][0])
+
+        def update_status():
+            if not find_window.winfo_exists():
+                return
+            progress = self.folder_index.progress
+            if self.folder_index.is_refreshing():
+                if progress:
+                    status_label.config(text=f"Indexing: {progress[0]} of {progress[1]} changed files")
+                find_window.after(300, update_status)
+            else:
+                status_label.config(text=f"{self.folder_index.count()} files indexed")
+                if search_var.get():
+                    self.folder_index.search_result = None  # Pick up files indexed since the last search
+                    on_search_change()
+
+        find_window = tk.Toplevel(self.root)
+        find_window.title("Find in Folders")
+        find_window.geometry("800x500")
+
+        search_var = tk.StringVar()
+        search_entry = tk.Entry(find_window, textvariable=search_var)
+        search_entry.pack(fill="x", padx=10, pady=(10, 0))
+        search_entry.bind("<Down>", lambda event: results_list.listbox.focus_set())
+        search_entry.bind("<Return>", open_hit)
+        search_entry.focus_set()
+        search_var.trace_add("write", on_search_change)
+
+        status_label = tk.Label(find_window, anchor="w")
+        status_label.pack(side=tk.BOTTOM, fill="x", padx=10, pady=(0, 10))
+
+        results_list = VirtualListbox(find_window, on_select=show_path, on_activate=open_hit)
+        results_list.pack(fill="both", expand=True, padx=10, pady=10)
+
+        update_status()
+
+    def quick_open(self, event=None):
+        """Fuzzy-find a file by name among the quick folders and the default open folder."""
+        if not self.path_index:
+            self.path_index = PathIndex(self.PATH_INDEX_FILE)
+        roots = [(os.path.basename(os.path.abspath(self.default_open_folder)) or "/", self.default_open_folder)]
+        roots += [(name, folder) for name, folder in self.quick_folders]
+        self.path_index.refresh(roots)
+        results = []
+        shown_catalog = None
+        search_job = None
+
+        def open_result(index=None):
+            if results and results_list.selected is not None:
+                path = shown_catalog.paths[results[results_list.selected]]
+                palette.destroy()
+                self.open_file(file_path=path)
+
+        def label(index):
+            return shown_catalog.labels[results[index]]
+
+        def run_search():
+            nonlocal search_job, shown_catalog
+            search_job = None
+            shown_catalog = self.path_index.catalog
+            results[:] = self.path_index.search(search_var.get())
+            results_list.set_items(len(results), label)
+
+        def on_search_change(*args):
+            nonlocal search_job
+            if search_job:
+                palette.after_cancel(search_job)
+            search_job = palette.after(30, run_search)
+
+        def wait_for_refresh():
+            if not palette.winfo_exists():
+                return
+            if self.path_index.is_refreshing():
+                status_label.config(text="Scanning folders...")
+                palette.after(200, wait_for_refresh)
+            else:
+                status_label.config(text=f"{len(self.path_index.catalog.labels)} files")
+                run_search()
+
+        palette = tk.Toplevel(self.root)
+        palette.title("Quick Open")
+        palette.geometry("700x450")
+
+        search_var = tk.StringVar()
+        search_entry = tk.Entry(palette, textvariable=search_var)
+        search_entry.pack(fill="x", padx=10, pady=(10, 0))
+        search_entry.bind("<Down>", lambda event: results_list.move_selection(1))
+        search_entry.bind("<Up>", lambda event: results_list.move_selection(-1))
+        search_entry.bind("<Return>", open_result)
+        search_entry.bind("<Escape>", lambda event: palette.destroy())
+        search_entry.focus_set()
+        search_var.trace_add("write", on_search_change)
+
+        status_label = tk.Label(palette, anchor="w")
+        status_label.pack(side=tk.BOTTOM, fill="x", padx=10, pady=(0, 10))
+
+        results_list = VirtualListbox(palette, on_activate=open_result)
+        results_list.pack(fill="both", expand=True, padx=10, pady=10)
+
+        run_search()
+        wait_for_refresh()
+
     def open_file_from_folder(self, folder_path):
         """Open a file from the specified folder."""
         file_path = filedialog.askopenfilename(
@@ -604,6 +3445,9 @@ class MuText:
 
 
 if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()  # Needed for the preview process in PyInstaller builds
     root = tk.Tk()
     editor = MuText(root)
     root.attributes("-fullscreen", True)
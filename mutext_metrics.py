@@ -0,0 +1,116 @@
+"""
+Counters and timings for the editor's hot paths, shown in View > Performance and served as
+Prometheus text at /metrics on the preview server. Nothing is recorded until METRICS.enabled
+is set, and while it isn't each hook costs a single attribute check.
+"""
+
+import time
+import threading
+import functools
+
+
+class Metrics:
+    """Thread-safe registry of timings (count, sum, max), counters and gauges."""
+
+    prefix = "mutext_"
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.timings = {}  # name -> [count, total seconds, max seconds]
+        self.counters = {}  # name -> total
+        self.gauges = {}  # name -> last value
+        self.descriptions = {}  # name -> HELP text
+        self.collectors = []  # Functions returning {counter name: total}, read when exporting
+
+    def describe(self, name, description):
+        self.descriptions[name] = description
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                self.timings[name] = [1, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[name] = value
+
+    def reset(self):
+        with self.lock:
+            self.timings.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def snapshot(self):
+        """Copies of (timings, counters, gauges), with the collectors' counters merged in."""
+        with self.lock:
+            timings = {name: list(timing) for name, timing in self.timings.items()}
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+        for collector in self.collectors:
+            counters.update(collector())
+        return timings, counters, gauges
+
+    def prometheus(self):
+        """Everything in the Prometheus text exposition format."""
+        timings, counters, gauges = self.snapshot()
+        lines = []
+
+        def header(name, metric, kind):
+            if name in self.descriptions:
+                lines.append(f"# HELP {metric} {self.descriptions[name]}")
+            lines.append(f"# TYPE {metric} {kind}")
+
+        for name, (count, total, longest) in sorted(timings.items()):
+            metric = f"{self.prefix}{name}_seconds"
+            header(name, metric, "summary")
+            lines.append(f"{metric}_count {count}")
+            lines.append(f"{metric}_sum {total:.6f}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines.append(f"{metric}_max {longest:.6f}")
+        for name, total in sorted(counters.items()):
+            metric = f"{self.prefix}{name}_total"
+            header(name, metric, "counter")
+            lines.append(f"{metric} {total}")
+        for name, value in sorted(gauges.items()):
+            metric = f"{self.prefix}{name}"
+            header(name, metric, "gauge")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def timed(name, description=None):
+    """Decorator recording how long each call of the function takes, as the timing name."""
+    if description:
+        METRICS.describe(name, description)
+
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
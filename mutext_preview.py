@@ -0,0 +1,479 @@
+"""
+Live preview server, imported by the editor only when a preview is first rendered
+so http.server and friends stay off the startup path.
+"""
+
+import os
+import threading
+import hashlib
+import gzip
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from mutext_render import DocumentSnapshot, KATEX_CDN, build_preview_page
+from mutext_metrics import METRICS, timed
+
+try:
+    import brotli  # Optional: smaller precompressed KaTeX assets
+except ImportError:
+    brotli = None
+
+
+class KatexAssets:
+    """
+    Local KaTeX bundle (the "dist" folder of the katex package, fetched by fetch_katex.sh).
+    Everything is served under /assets/<bundle hash>/, so the URLs change whenever any file does
+    and can be cached forever. Text assets are compressed once, with brotli when it is installed.
+    """
+
+    prefix = "/assets/"
+    compressible = (".css", ".js", ".ttf", ".svg")
+    content_types = {
+        ".css": "text/css; charset=utf-8",
+        ".js": "application/javascript; charset=utf-8",
+        ".woff2": "font/woff2",
+        ".woff": "font/woff",
+        ".ttf": "font/ttf",
+        ".svg": "image/svg+xml",
+    }
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.files = {}  # relative path -> {"identity": bytes, "gzip": bytes, "br": bytes}
+        self.digest = None
+        self.lock = threading.Lock()
+
+    def available(self):
+        return os.path.isfile(os.path.join(self.folder, "katex.min.js"))
+
+    def load(self):
+        """Read and compress the bundle once; later calls are free."""
+        with self.lock:
+            if self.digest is not None:
+                return
+            bundle_hash = hashlib.sha1()
+            for folder, _, names in sorted(os.walk(self.folder)):
+                for name in sorted(names):
+                    path = os.path.join(folder, name)
+                    relative = os.path.relpath(path, self.folder).replace(os.sep, "/")
+                    if not name.endswith(tuple(self.content_types)):
+                        continue
+                    with open(path, "rb") as asset_file:
+                        data = asset_file.read()
+                    bundle_hash.update(relative.encode("utf-8"))
+                    bundle_hash.update(hashlib.sha1(data).digest())
+                    variants = {"identity": data}
+                    if name.endswith(self.compressible):
+                        variants["gzip"] = gzip.compress(data, compresslevel=9)
+                        if brotli:
+                            variants["br"] = brotli.compress(data)
+                    self.files[relative] = variants
+            self.digest = bundle_hash.hexdigest()[:12]
+
+    def base_url(self):
+        self.load()
+        return f"{self.prefix}{self.digest}"
+
+    def lookup(self, url_path, accept_encoding):
+        """Return (content type, encoding, body) for an asset URL, or None if it isn't part of the bundle."""
+        self.load()
+        digest, _, relative = url_path[len(self.prefix):].partition("/")
+        variants = self.files.get(relative)
+        if digest != self.digest or variants is None:
+            return None
+        accepted = [token.split(";")[0].strip() for token in accept_encoding.split(",")]
+        for encoding in ("br", "gzip"):
+            if encoding in variants and encoding in accepted:
+                break
+        else:
+            encoding = "identity"
+        content_type = self.content_types[os.path.splitext(relative)[1]]
+        return content_type, encoding, variants[encoding]
+
+
+class PreviewDocument:
+    """
+    Versioned snapshot of the editor text shared with the preview server.
+    The Tk thread publishes a DocumentSnapshot with its version; the page and its ETag are built
+    at most once per version, on the first request that needs them.
+    """
+
+    def __init__(self, katex_base=KATEX_CDN):
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.katex_base = katex_base
+        self.version = -1
+        self.snapshot = DocumentSnapshot(-1, text="")
+        self.page = None  # (etag, encoded page) for the current version, built lazily
+        self.compressed_page = None  # gzip of self.page, also built lazily
+
+    def update(self, version, snapshot):
+        with self.lock:
+            if version == self.version:
+                return
+            self.version = version
+            self.snapshot = snapshot
+            self.page = None
+            self.compressed_page = None
+            self.changed.notify_all()
+
+    def set_katex_base(self, katex_base):
+        with self.lock:
+            if katex_base != self.katex_base:
+                self.katex_base = katex_base
+                self.page = None
+                self.compressed_page = None
+
+    def wait_for_change(self, known_version, timeout, stopping=None):
+        """
+        Block until the version differs from known_version, timeout expires or the stopping event is set.
+        Return the current version, or None once stopping is set.
+        """
+        with self.lock:
+            self.changed.wait_for(
+                lambda: self.version != known_version or (stopping is not None and stopping.is_set()), timeout
+            )
+            if stopping is not None and stopping.is_set():
+                return None
+            return self.version
+
+    def wake_all(self):
+        """Wake every thread blocked in wait_for_change so it can notice a shutdown."""
+        with self.lock:
+            self.changed.notify_all()
+
+    def get_page(self, compressed=False):
+        """Return (etag, page bytes) for the current version, gzipped if compressed is set."""
+        with self.lock:
+            if self.page is None:
+                # The tag depends only on the text, so it can be embedded in the page it identifies
+                text = self.snapshot.text()  # Joined here, on a server thread, rather than on the Tk thread
+                etag = '"%s"' % hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+                self.page = (etag, build_preview_page(text, etag, self.katex_base).encode("utf-8"))
+            if not compressed:
+                return self.page
+            if self.compressed_page is None:
+                etag, body = self.page
+                self.compressed_page = (etag, gzip.compress(body, compresslevel=6))
+            return self.compressed_page
+
+
+class LivePreviewHandler(BaseHTTPRequestHandler):
+    """Serve the preview page, answering conditional requests with 304 when the version is unchanged."""
+
+    keepalive_interval = 15  # Seconds between SSE comments, so closed tabs are noticed
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/events":
+            METRICS.count("preview_event_streams")
+            self.stream_events()  # Open for as long as the tab is, so it isn't timed
+        else:
+            self.respond(path)
+
+    @timed("preview_request", "Time to answer a preview page, asset or metrics request.")
+    def respond(self, path):
+        METRICS.count("preview_requests")
+        if path == "/metrics":
+            self.send_metrics()
+        elif path.startswith(KatexAssets.prefix):
+            self.send_asset(path)
+        else:
+            self.send_page()
+
+    def send_metrics(self):
+        body = (METRICS.prometheus() + (self.server.editor_metrics or "")).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_asset(self, path):
+        assets = self.server.katex_assets
+        found = assets.lookup(path, self.headers.get("Accept-Encoding", "")) if assets else None
+        if found is None:
+            self.send_error(404)
+            return
+        content_type, encoding, body = found
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.end_headers()
+        self.wfile.write(body)
+        METRICS.count("preview_response_bytes", len(body))
+
+    def stream_events(self):
+        """Server-Sent Events: push the document version whenever it changes, and nothing otherwise."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        document = self.server.preview_document
+        known_version = None
+        try:
+            while True:
+                version = document.wait_for_change(known_version, self.keepalive_interval, self.server.stopping)
+                if version is None:
+                    break  # The server is shutting down
+                if version == known_version:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    known_version = version
+                    self.wfile.write(f"id: {version}\nevent: version\ndata: {version}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The preview tab was closed
+
+    def send_page(self):
+        compressed = "gzip" in self.headers.get("Accept-Encoding", "")
+        etag, body = self.server.preview_document.get_page(compressed)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            METRICS.count("preview_not_modified")
+            return
+        self.send_response(200)
+        self.send_header("Content-type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if compressed:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+        METRICS.count("preview_response_bytes", len(body))
+
+
+class PreviewServer:
+    """
+    Owns the live preview HTTP server: a threaded server (one thread per client, so a slow or
+    streaming client never blocks the others) on the preferred port, or any free port if that
+    one is taken, with a real shutdown that also ends open event streams.
+    """
+
+    def __init__(self, preview_document, host="localhost", preferred_port=8000):
+        self.preview_document = preview_document
+        self.host = host
+        self.preferred_port = preferred_port
+        self.katex_assets = None
+        self.editor_metrics = None  # Prometheus text from the editor, when serving from another process
+        self.server = None
+        self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, port=None):
+        """Start serving (on port if given, else the preferred port) if not already running; return the port in use."""
+        if self.is_running():
+            return self.server.server_port
+        try:
+            server = ThreadingHTTPServer((self.host, port or self.preferred_port), LivePreviewHandler)
+        except OSError:
+            # Port taken (e.g. by another MuText window): let the OS pick a free one
+            server = ThreadingHTTPServer((self.host, 0), LivePreviewHandler)
+        server.daemon_threads = True
+        server.preview_document = self.preview_document
+        server.katex_assets = self.katex_assets
+        server.editor_metrics = self.editor_metrics
+        server.stopping = threading.Event()
+        self.server = server
+        self.thread = threading.Thread(target=server.serve_forever, daemon=True)
+        self.thread.start()
+        return server.server_port
+
+    def stop(self):
+        """Stop accepting requests, end open event streams and release the port."""
+        if not self.server:
+            return
+        server, self.server = self.server, None
+        server.stopping.set()
+        self.preview_document.wake_all()
+        server.shutdown()  # Returns once serve_forever has exited
+        server.server_close()
+        self.thread.join(timeout=2)
+        self.thread = None
+
+    def publish(self, version, snapshot):
+        self.preview_document.update(version, snapshot)
+
+    def publish_metrics(self, text):
+        """
+        Serve the editor's metrics (Prometheus text, or None once they are disabled) along with the
+        server's own. Only needed in a preview process: in the editor process the registry is shared.
+        """
+        METRICS.enabled = text is not None
+        self.editor_metrics = text
+        if self.server:
+            self.server.editor_metrics = text
+
+    def restart(self):
+        """Stop and start again, on the same port when possible so open preview tabs reconnect by themselves."""
+        port = self.server.server_port if self.server else None
+        self.stop()
+        return self.start(port)
+
+    def url(self):
+        host = "localhost" if self.host in ("", "0.0.0.0") else self.host
+        return f"http://{host}:{self.server.server_port}"
+
+
+def run_preview_process(conn, host, preferred_port, katex_folder):
+    """Entry point of the preview child process: serve pages built from snapshots received over conn."""
+    server = PreviewServer(PreviewDocument(), host, preferred_port)
+    katex_assets = KatexAssets(katex_folder)
+    if katex_assets.available():
+        server.preview_document.set_katex_base(katex_assets.base_url())
+        server.katex_assets = katex_assets
+    try:
+        port = server.start()
+    except OSError as e:
+        conn.send(("error", str(e)))
+        return
+    conn.send(("port", port))
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == "update":
+                # The text follows as raw UTF-8 bytes, which is cheaper to send than a pickled string
+                text = conn.recv_bytes().decode("utf-8")
+                server.publish(message[1], DocumentSnapshot(message[1], text=text))
+            elif message[0] == "metrics":
+                server.publish_metrics(message[1])
+            elif message[0] == "stop":
+                break
+    except EOFError:
+        pass  # The editor went away
+    server.stop()
+
+
+class PreviewProcess:
+    """
+    Runs the preview server in a child process so building, compressing and serving pages never
+    competes with the editor for the GIL. The editor only pushes versioned snapshots through a pipe;
+    their text is joined and sent by a sender thread, which only ever sends the newest one.
+    Has the same interface as PreviewServer.
+    """
+
+    def __init__(self, host="localhost", preferred_port=8000, katex_folder=""):
+        self.host = host
+        self.preferred_port = preferred_port
+        self.katex_folder = katex_folder
+        self.process = None
+        self.conn = None
+        self.port = None
+        self.last_snapshot = None  # Replayed to a restarted child
+        self.condition = threading.Condition()
+        self.pending = {}  # "update" -> (version, snapshot), "metrics" -> text; the newest of each
+        self.stopping = False
+        self.sender = None
+
+    def is_running(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self, port=None):
+        if self.is_running():
+            return self.port
+        # Spawned rather than forked: forking a process that owns a Tk interpreter and threads
+        # isn't safe. The child re-imports the editor's modules, which has no side effects.
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=run_preview_process,
+            args=(child_conn, self.host, port or self.preferred_port, self.katex_folder),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        if not self.conn.poll(10):
+            self.stop()
+            raise OSError("The preview process did not start")
+        status, value = self.conn.recv()
+        if status == "error":
+            self.stop()
+            raise OSError(value)
+        self.port = value
+        self.stopping = False
+        self.sender = threading.Thread(target=self.send_pending, args=(self.conn,), daemon=True)
+        self.sender.start()
+        if self.last_snapshot:
+            self.publish(*self.last_snapshot)
+        return self.port
+
+    def send_pending(self, conn):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.stopping)
+                if self.stopping:
+                    break
+                batch = self.pending
+                self.pending = {}
+            try:
+                if "update" in batch:
+                    version, snapshot = batch["update"]
+                    conn.send(("update", version))
+                    conn.send_bytes(snapshot.text().encode("utf-8"))
+                if "metrics" in batch:
+                    conn.send(("metrics", batch["metrics"]))
+            except (BrokenPipeError, OSError):
+                return  # The child died; the next start() spawns a new one
+        try:
+            conn.send(("stop",))
+        except (BrokenPipeError, OSError):
+            pass
+
+    def submit(self, kind, value):
+        if not self.is_running():
+            return
+        with self.condition:
+            self.pending[kind] = value
+            self.condition.notify()
+
+    def publish(self, version, snapshot):
+        self.last_snapshot = (version, snapshot)
+        self.submit("update", (version, snapshot))
+
+    def publish_metrics(self, text):
+        self.submit("metrics", text)
+
+    def stop(self):
+        if not self.process:
+            return
+        with self.condition:
+            self.pending = {}
+            self.stopping = True
+            self.condition.notify()
+        if self.sender:
+            self.sender.join(timeout=3)
+        else:
+            try:
+                self.conn.send(("stop",))  # Failed before the sender was started
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=3)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        if self.sender:
+            self.sender.join()  # Unblocked by the child's end of the pipe closing
+        self.conn.close()
+        self.process = None
+        self.conn = None
+        self.sender = None
+
+    def restart(self):
+        port = self.port if self.is_running() else None
+        self.stop()
+        return self.start(port)
+
+    def url(self):
+        host = "localhost" if self.host in ("", "0.0.0.0") else self.host
+        return f"http://{host}:{self.port}"
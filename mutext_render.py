@@ -0,0 +1,423 @@
+"""
+Page rendering and document snapshots, shared by the editor, the preview server and the
+headless command line. Nothing here imports tkinter, so batch rendering runs without a display:
+
+    python mutext.py render notes/ extra.txt -o out/
+    python mutext.py export notes/ -o site/
+"""
+import os
+import sys
+import time
+import json
+import codecs
+import hashlib
+import tempfile
+
+
+def atomic_write(path, text, encoding="utf-8"):
+    """Write text to path via a temp file in the same folder, fsync, then rename over it."""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".mutext-", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding=encoding, newline="") as temp_file:
+            temp_file.write(text)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)  # Keep the original file's permissions
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DocumentSnapshot:
+    """One immutable version of the document, shared by save, autosave and the preview."""
+
+    def __init__(self, version, rope=None, text=None):
+        self.version = version
+        self.rope = rope
+        self.cached_text = text
+
+    def text(self):
+        """The full text, joined at most once per snapshot (safe to call from any thread)."""
+        if self.cached_text is None:
+            self.cached_text = self.rope.text()
+        return self.cached_text
+
+
+KATEX_CDN = "https://cdn.jsdelivr.net/npm/katex@0.16.19/dist"
+
+KATEX_HEAD = """
+<link rel="stylesheet" href="{base}/katex.min.css">
+<script defer src="{base}/katex.min.js"></script>
+<script defer src="{base}/contrib/auto-render.min.js" onload="{onload}"></script>
+"""
+
+PREVIEW_HEAD = """
+<style>mutext-block { display: contents; }</style>
+<script>
+let previewTag = document.querySelector("meta[name=preview-etag]").content;
+const formulaCache = new Map();  // "D"/"I" + TeX source -> rendered KaTeX HTML
+const formulaCacheSize = 5000;
+
+function cacheFormulas() {
+    // auto-render typesets each formula through katex.render, so caching there skips unchanged formulas
+    const renderFormula = katex.render;
+    katex.render = function(tex, element, options) {
+        const key = (options && options.displayMode ? "D" : "I") + tex;
+        const cached = formulaCache.get(key);
+        if (cached !== undefined) {
+            formulaCache.delete(key);  // Move to the back so the cache evicts least recently used first
+            formulaCache.set(key, cached);
+            element.innerHTML = cached;
+            return;
+        }
+        renderFormula(tex, element, options);
+        formulaCache.set(key, element.innerHTML);
+        if (formulaCache.size > formulaCacheSize) {
+            formulaCache.delete(formulaCache.keys().next().value);
+        }
+    };
+}
+
+function splitBlocks(body) {
+    // Top-level nodes become blocks; long text runs are split further at blank lines
+    const blocks = [];
+    for (const node of Array.from(body.childNodes)) {
+        if (node.nodeType === Node.TEXT_NODE) {
+            for (const part of node.textContent.split(/(?<=\\n[ \\t]*\\n)/)) {
+                blocks.push({key: "T" + part, nodes: [document.createTextNode(part)]});
+            }
+        } else {
+            blocks.push({key: "E" + (node.outerHTML || node.textContent), nodes: [node]});
+        }
+    }
+    return blocks;
+}
+
+function patchBody(body) {
+    // Reuse the rendered block for every unchanged piece, so only new or edited blocks are typeset
+    const existing = new Map();
+    for (const element of Array.from(document.body.children)) {
+        if (element.tagName !== "MUTEXT-BLOCK") {
+            element.remove();
+            continue;
+        }
+        if (!existing.has(element.blockKey)) {
+            existing.set(element.blockKey, []);
+        }
+        existing.get(element.blockKey).push(element);
+    }
+    const ordered = splitBlocks(body).map(block => {
+        const reused = existing.get(block.key);
+        if (reused && reused.length) {
+            return reused.shift();
+        }
+        const element = document.createElement("mutext-block");
+        element.blockKey = block.key;
+        element.append(...block.nodes);
+        renderMathInElement(element);
+        return element;
+    });
+    ordered.forEach((element, index) => {
+        const current = document.body.children[index];
+        if (current !== element) {
+            document.body.insertBefore(element, current || null);
+        }
+    });
+    for (const leftovers of existing.values()) {
+        leftovers.forEach(element => element.remove());
+    }
+}
+
+function refreshPreview() {
+    fetch("/", {cache: "no-store", headers: {"If-None-Match": previewTag}})
+        .then(response => {
+            if (response.status === 304) {
+                return null;  // Nothing changed since the last refresh
+            }
+            previewTag = response.headers.get("ETag");
+            return response.text();
+        })
+        .then(html => {
+            if (html !== null) {
+                patchBody(new DOMParser().parseFromString(html, "text/html").body);
+            }
+        });
+}
+
+function startPreview() {
+    cacheFormulas();
+    const initial = document.body.cloneNode(true);
+    document.body.replaceChildren();
+    patchBody(initial);
+    // The server pushes an event only when the document version changes
+    new EventSource("/events").addEventListener("version", refreshPreview);
+}
+</script>
+"""
+
+
+def build_preview_page(html_content, etag="", katex_base=KATEX_CDN):
+    """Wrap the editor text in the preview page template."""
+    return (
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><meta name=\"preview-etag\" content='{etag}'>"
+        f"{KATEX_HEAD.format(base=katex_base, onload='startPreview();')}{PREVIEW_HEAD}</head>"
+        f"<body>{html_content}</body></html>"
+    )
+
+
+def build_static_page(html_content, katex_base=KATEX_CDN):
+    """The preview page template without the live-reload script, for exported files."""
+    return (
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"{KATEX_HEAD.format(base=katex_base, onload='renderMathInElement(document.body);')}</head>"
+        f"<body>{html_content}</body></html>"
+    )
+
+
+def detect_encoding(path, sample_size=1 << 20):
+    """Pick an encoding before loading: a BOM if present, else UTF-8 if the first MB decodes, else Latin-1."""
+    with open(path, "rb") as file:
+        sample = file.read(sample_size)
+    # Unless the sample is the whole file, tolerate a multi-byte character cut off at its end
+    return sniff_encoding(sample, complete=len(sample) < sample_size)
+
+
+def sniff_encoding(sample, complete=True):
+    """The encoding detect_encoding picks for a file starting with sample (the whole file if complete)."""
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+SOURCE_EXTENSIONS = (".txt", ".html", ".htm", ".md", ".tex")  # Files picked up when a folder is rendered
+
+
+def read_source(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    return data.decode(sniff_encoding(data), errors="replace")
+
+
+def output_name(name):
+    """note.txt -> note.html (HTML sources keep their name)."""
+    stem, extension = os.path.splitext(name)
+    return name if extension.lower() in (".html", ".htm") else stem + ".html"
+
+
+def collect_sources(paths, output_folder):
+    """Yield (source, target) for the files named and the text files under the folders named."""
+    output_folder = os.path.abspath(output_folder)
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path, os.path.join(output_folder, output_name(os.path.basename(path)))
+            continue
+        for folder, subfolders, files in os.walk(path):
+            # Skip hidden folders, and the output folder when it sits inside a source folder
+            subfolders[:] = [
+                name for name in subfolders
+                if not name.startswith(".") and os.path.abspath(os.path.join(folder, name)) != output_folder
+            ]
+            relative = os.path.relpath(folder, path)
+            for name in files:
+                if name.lower().endswith(SOURCE_EXTENSIONS) and not name.startswith("."):
+                    yield (
+                        os.path.join(folder, name),
+                        os.path.normpath(os.path.join(output_folder, relative, output_name(name))),
+                    )
+
+
+def render_file(task):
+    """Process-pool worker: render one (source, target, katex_base), returning (source, target, error)."""
+    source, target, katex_base = task
+    try:
+        page = build_static_page(read_source(source), katex_base)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "w", encoding="utf-8", newline="") as file:
+            file.write(page)
+    except (OSError, ValueError) as e:
+        return source, target, str(e)
+    return source, target, None
+
+
+def render_files(tasks, jobs=None, chunk_size=16, worker=render_file):
+    """
+    Render (source, target, katex_base) tasks, yielding each result as soon as its file is written.
+    Workers read and write the files themselves, so only paths cross the process boundary.
+    """
+    tasks = list(tasks)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(tasks) <= chunk_size:
+        # Not worth starting a pool for a handful of files
+        yield from map(worker, tasks)
+        return
+    import multiprocessing  # Imported on demand: the editor imports this module at startup
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap_unordered(worker, tasks, chunk_size)
+
+
+MANIFEST_NAME = ".mutext-manifest.json"
+
+
+def export_file(task):
+    """
+    Process-pool worker for export: render one (source, target, katex_base, known hashes) task.
+    Returns (source, target, manifest entry, written, error). The page is only rewritten when the
+    source's content hash differs from the one in the manifest, or the output is gone or different.
+    """
+    source, target, katex_base, known = task
+    try:
+        stat = os.stat(source)
+        with open(source, "rb") as file:
+            data = file.read()
+        entry = {
+            "source": source,
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "source_hash": hashlib.sha1(data).hexdigest(),
+        }
+        if known and known["source_hash"] == entry["source_hash"] and os.path.exists(target):
+            entry["output_hash"] = known["output_hash"]
+            return source, target, entry, False, None
+        page = build_static_page(data.decode(sniff_encoding(data), errors="replace"), katex_base)
+        entry["output_hash"] = hashlib.sha1(page.encode("utf-8")).hexdigest()
+        if known and known["output_hash"] == entry["output_hash"] and os.path.exists(target):
+            return source, target, entry, False, None
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        atomic_write(target, page)
+    except (OSError, ValueError) as e:
+        return source, target, None, False, str(e)
+    return source, target, entry, True, None
+
+
+def load_manifest(output_folder):
+    try:
+        with open(os.path.join(output_folder, MANIFEST_NAME), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def remove_output(output_folder, target):
+    """Delete an exported page and any folders it leaves empty (never the output folder itself)."""
+    try:
+        os.remove(target)
+    except FileNotFoundError:
+        pass
+    folder = os.path.dirname(target)
+    while folder != output_folder and folder.startswith(output_folder + os.sep):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            break  # Not empty
+        folder = os.path.dirname(folder)
+
+
+def export(paths, output_folder, katex_base=KATEX_CDN, jobs=None, on_result=None):
+    """
+    Bring output_folder up to date with the notes under paths.
+    The manifest in the output folder maps each page to its source's mtime, size and content hash
+    and to the page's own hash: sources whose mtime and size are unchanged are skipped without
+    being read, changed ones are re-rendered only if their content actually differs, and pages
+    whose source disappeared are deleted. A changed template or KaTeX URL rebuilds everything.
+    Returns counts of pages written, unchanged, removed and failed.
+    """
+    output_folder = os.path.abspath(output_folder)
+    os.makedirs(output_folder, exist_ok=True)
+    manifest = load_manifest(output_folder)
+    template = hashlib.sha1(build_static_page("", katex_base).encode("utf-8")).hexdigest()
+    old_pages = manifest.get("pages", {}) if manifest.get("template") == template else {}
+    pages = {}
+    counts = {"written": 0, "unchanged": 0, "removed": 0, "failed": 0}
+
+    tasks = []
+    for source, target in collect_sources(paths, output_folder):
+        key = os.path.relpath(target, output_folder).replace(os.sep, "/")
+        source = os.path.abspath(source)
+        known = old_pages.get(key)
+        if known and known["source"] == source:
+            try:
+                stat = os.stat(source)
+                if (stat.st_mtime_ns, stat.st_size) == (known["mtime"], known["size"]) and os.path.exists(target):
+                    pages[key] = known
+                    counts["unchanged"] += 1
+                    continue
+            except OSError:
+                pass
+        else:
+            known = None
+        tasks.append((source, target, katex_base, known))
+
+    for source, target, entry, written, error in render_files(tasks, jobs, worker=export_file):
+        if error:
+            counts["failed"] += 1
+        else:
+            pages[os.path.relpath(target, output_folder).replace(os.sep, "/")] = entry
+            counts["written" if written else "unchanged"] += 1
+        if on_result:
+            on_result(source, target, written, error)
+
+    for key in old_pages.keys() - pages.keys():
+        remove_output(output_folder, os.path.join(output_folder, *key.split("/")))
+        counts["removed"] += 1
+
+    if pages != old_pages or manifest.get("template") != template:
+        atomic_write(os.path.join(output_folder, MANIFEST_NAME), json.dumps({"template": template, "pages": pages}))
+    return counts
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="mutext.py", description="Render notes to standalone HTML pages.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    render_parser = commands.add_parser("render", help="render files and folders of notes")
+    export_parser = commands.add_parser(
+        "export", help="incrementally export folders of notes, removing pages whose note is gone"
+    )
+    for command in (render_parser, export_parser):
+        command.add_argument("paths", nargs="+", help="files and folders to render")
+        command.add_argument("-o", "--output", default="out", help="output folder (default: out)")
+        command.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+        command.add_argument("--katex-base", default=KATEX_CDN, help="URL of the KaTeX dist folder")
+        command.add_argument("-v", "--verbose", action="store_true", help="print each page as it is written")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    failures = []
+
+    def report(source, target, written, error):
+        if error:
+            failures.append(source)
+            print(f"{source}: {error}", file=sys.stderr)
+        elif written and args.verbose:
+            print(target)
+
+    if args.command == "export":
+        counts = export(args.paths, args.output, args.katex_base, args.jobs, on_result=report)
+        print(f"Exported to {args.output} in {time.perf_counter() - start:.2f}s: {counts['written']} written, "
+              f"{counts['unchanged']} unchanged, {counts['removed']} removed"
+              + (f", {counts['failed']} failed" if counts["failed"] else ""))
+    else:
+        tasks = ((source, target, args.katex_base) for source, target in collect_sources(args.paths, args.output))
+        rendered = 0
+        for source, target, error in render_files(tasks, args.jobs):
+            report(source, target, True, error)
+            rendered += not error
+        print(f"Rendered {rendered} file(s) to {args.output} in {time.perf_counter() - start:.2f}s"
+              + (f", {len(failures)} failed" if failures else ""))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())